@@ -1,17 +1,38 @@
-from bs4 import BeautifulSoup
-import pandas as pd
-from openpyxl.styles import PatternFill, Border, Side, Alignment
 import json
 import customtkinter as CTk
 import tkinter as tk
-from PIL import Image
 from pathlib import Path
 import os
 import sys
+import argparse
+import glob
+import re
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor, as_completed
+import importlib.util
+import hashlib
+import marshal
+import zlib
+import threading
+import queue
+import contextlib
+import collections
+import time
+import fnmatch
+
+#bs4, pandas, numpy, openpyxl and PIL are imported in the functions where they are used,
+#so the window is opened without waiting for them (see tools/startup_timing.py)
 
 #Build command:
 #pyinstaller --onefile --windowed --add-data "close.png:." --add-data "settings.png:." --add-data "folder.png:." .\main.py
 
+#Html parser backends in order of preference, selectolax and lxml are written in C and much faster,
+#html.parser (BeautifulSoup) is built into Python so it is always available as a fallback
+HTML_PARSER_BACKENDS = ["selectolax", "lxml", "html.parser"]
+
+#Version of the parse cache files, must be changed when the parsed data changes, old files are then deleted
+PARSE_CACHE_VERSION = 2
+
 #Сustom class for the drag and drop system which is based on the base listBox class in Tkinter
 class DraggableListbox(CTk.CTkFrame):
     def __init__(self, master, items, **kwargs):
@@ -51,63 +72,572 @@ class DraggableListbox(CTk.CTkFrame):
             #Update selected index
             self.selected_index = current_index
 
+    #Replace all elements
+    def set_items(self, items):
+        self.listbox.delete(0, tk.END)
+        for item in items:
+            self.listbox.insert(tk.END, item)
+        self.selected_index = None
+
     #Return elements in the order set by user
     def get_items(self):
         return self.listbox.get(0, tk.END)
 
+#Model of the fields selection on the main screen, it keeps the state of every field without widgets
+class FieldSelectionModel:
+    def __init__(self, fields):
+        #Names of the fields, students name is always selected so it is not here
+        self.fields = fields
+        self.checked = [False] * len(fields)
+        #Desired names of the fields
+        self.aliases = [""] * len(fields)
+        #Indexes of the fields by name, the same name can be used by several fields
+        self._indexes = {}
+        for n, field in enumerate(fields):
+            self._indexes.setdefault(field, []).append(n)
+
+    #Select or deselect field, the desired name of a not selected field is cleared
+    def set_checked(self, index, value):
+        self.checked[index] = value
+        if not value:
+            self.aliases[index] = ""
+
+    #Set the same state for all fields
+    def set_all(self, value):
+        self.checked = [value] * len(self.fields)
+        if not value:
+            self.aliases = [""] * len(self.fields)
+
+    #Select only the fields of the template, template is a list of [name] or [name, desired name]
+    def apply_template(self, template):
+        self.set_all(False)
+        for field in template:
+            for index in self._indexes.get(field[0], ()):
+                self.checked[index] = True
+                #If element (array) lenght is 2 its mean that second element is preferred name
+                if len(field) == 2:
+                    self.aliases[index] = field[1]
+
+#List of the fields with checkboxes and inputs, widgets are created only for the visible rows
+#and are reused for other fields when the list is scrolled, so the number of fields does not matter
+class VirtualFieldList(CTk.CTkFrame):
+    def __init__(self, master, model, visible_rows=5, font="Inter", active_color="#EBEBEB", inactive_color="#D5D5D5", **kwargs):
+        super().__init__(master, **kwargs)
+        self.model = model
+        self._visible_rows = visible_rows
+        self._active_color = active_color
+        self._inactive_color = inactive_color
+        #Index of the field in the first row
+        self._first = 0
+
+        rows_frame = CTk.CTkFrame(master=self, fg_color=inactive_color)
+        rows_frame.grid(row=0, column=0, sticky="nw", padx=(5,0))
+        self._scrollbar = CTk.CTkScrollbar(master=self, command=self._on_scrollbar)
+        self._scrollbar.grid(row=0, column=1, sticky="ns")
+        self.grid_columnconfigure(0, weight=1)
+        self.grid_rowconfigure(0, weight=1)
+
+        self._checkboxes = []
+        self._entries = []
+        for n in range(visible_rows):
+            checkbox = CTk.CTkCheckBox(master=rows_frame, text="", command=lambda slot=n: self._on_check(slot), font=(font,14), text_color="black", checkbox_width=20, checkbox_height=20)
+            checkbox.grid(row=n*2, column=0, sticky="w")
+            entry = CTk.CTkEntry(master=rows_frame, font=(font, 16),width=200, fg_color=inactive_color,text_color="black")
+            entry.grid(row=n*2+1, column=0, sticky="w",pady=(0,10), padx=(25,0))
+            entry.bind("<KeyRelease>", lambda event, slot=n: self._on_entry_change(slot))
+            entry.bind("<FocusOut>", lambda event, slot=n: self._on_entry_change(slot))
+            entry.bind("<Return>", lambda event, slot=n: self._focus_next_entry(slot))
+            self._checkboxes.append(checkbox)
+            self._entries.append(entry)
+
+        #Scroll with mouse wheel over any part of the list
+        for widget in [self, rows_frame] + self._checkboxes + self._entries:
+            widget.bind("<MouseWheel>", self._on_mouse_wheel)
+            widget.bind("<Button-4>", self._on_mouse_wheel)
+            widget.bind("<Button-5>", self._on_mouse_wheel)
+        self.refresh()
+
+    #Show another model, the list is scrolled to the top
+    def set_model(self, model):
+        self.model = model
+        self._first = 0
+        self.refresh()
+
+    #Show the state of the model in the visible rows
+    def refresh(self):
+        self._first = max(0, min(self._first, len(self.model.fields) - self._visible_rows))
+        for slot, (checkbox, entry) in enumerate(zip(self._checkboxes, self._entries)):
+            index = self._first + slot
+            if index >= len(self.model.fields):
+                checkbox.grid_remove()
+                entry.grid_remove()
+                continue
+            checkbox.grid()
+            entry.grid()
+            checkbox.configure(text=self.model.fields[index])
+            entry.configure(state="normal")
+            if entry.get() != self.model.aliases[index]:
+                entry.delete(0, CTk.END)
+                entry.insert(0, self.model.aliases[index])
+            #Input is active only when the field is selected
+            if self.model.checked[index]:
+                checkbox.select()
+                entry.configure(fg_color=self._active_color)
+            else:
+                checkbox.deselect()
+                entry.configure(state="disabled", fg_color=self._inactive_color)
+        #Size of the scrollbar handle shows the visible part of the list
+        count = max(len(self.model.fields), 1)
+        self._scrollbar.set(self._first / count, min((self._first + self._visible_rows) / count, 1))
+
+    #Scroll so that the field is visible
+    def show(self, index):
+        if index < self._first:
+            self._first = index
+        elif index >= self._first + self._visible_rows:
+            self._first = index - self._visible_rows + 1
+        self.refresh()
+
+    #Checkbox was pressed by the user
+    def _on_check(self, slot):
+        self.model.set_checked(self._first + slot, self._checkboxes[slot].get() == 1)
+        self.refresh()
+
+    #Save text of the input to the model
+    def _on_entry_change(self, slot):
+        index = self._first + slot
+        if index < len(self.model.fields) and self.model.checked[index]:
+            self.model.aliases[index] = self._entries[slot].get()
+
+    #Pressing enter switches the focus to the input of the next selected field
+    def _focus_next_entry(self, slot):
+        self._on_entry_change(slot)
+        for index in range(self._first + slot + 1, len(self.model.fields)):
+            if self.model.checked[index]:
+                self.show(index)
+                self._entries[index - self._first].focus_set()
+                break
+
+    def _scroll(self, rows):
+        self._first += rows
+        self.refresh()
+
+    def _on_mouse_wheel(self, event):
+        if event.num == 4 or event.delta > 0:
+            self._scroll(-1)
+        else:
+            self._scroll(1)
+
+    #Scrollbar calls it with ("moveto", fraction) or ("scroll", number, "units"/"pages")
+    def _on_scrollbar(self, action, value, unit="units"):
+        if action == "moveto":
+            self._first = round(float(value) * len(self.model.fields))
+            self.refresh()
+        else:
+            self._scroll(int(value) * (self._visible_rows if unit == "pages" else 1))
+
 #Class for working with files
 class FileManager:
-    def __init__(self, config_file = "config.json"):
+    def __init__(self, config_file = "config.json", write_delay = 0.5):
         self.config_file = config_file
+        #Folder for the parse cache, it is next to the config file
+        self.cache_folder = os.path.join(os.path.dirname(os.path.abspath(config_file)), "cache")
+        #Folder for the run journal and the profiles, it is next to the config file too
+        self.logs_folder = os.path.join(os.path.dirname(os.path.abspath(config_file)), "logs")
         self.config = self._load_config()
+        #Writes are delayed, so several changes in a short time are written to the file once
+        self.write_delay = write_delay
+        self._write_lock = threading.Lock()
+        self._write_timer = None
+        self._pending_config = None
 
     #Load a config file
     def _load_config(self):
         with open(self.config_file, 'r') as file:
             return json.loads(file.read())
 
-    #Wite new config to config file
+    #Wite new config to config file, it is written after write_delay seconds without other changes
     def write_config(self, config_manager):
-        #New config
-        config = {}
-        #Iterate over the attributes of the config class
-        for attr in dir(config_manager):
-            #Weed out the basic methods
-            if not attr.startswith('__'):
-                #Get value from config attribute
-                value = getattr(config_manager, attr)
-                #Write it to new config
-                config[attr] = value
-        #Write new config to config file
-        with open(self.config_file, "w") as file:
-            file.write(json.dumps(config))
+        #Config is converted now, so later changes of the config manager do not get into this write
+        text = json.dumps(config_manager.to_dict())
+        with self._write_lock:
+            self._pending_config = text
+            if self._write_timer:
+                self._write_timer.cancel()
+            self._write_timer = threading.Timer(self.write_delay, self.flush)
+            self._write_timer.daemon = True
+            self._write_timer.start()
+
+    #Write the waiting config now, the file is replaced at once, so it is never left half written
+    def flush(self):
+        with self._write_lock:
+            if self._write_timer:
+                self._write_timer.cancel()
+                self._write_timer = None
+            text = self._pending_config
+            self._pending_config = None
+            if text is None:
+                return
+            tmp_path = f"{self.config_file}.tmp"
+            with open(tmp_path, "w") as file:
+                file.write(text)
+            os.replace(tmp_path, self.config_file)
 
 #Class for config
 class ConfigManager:
     def __init__(self, config):
+            #Config as it was read, keys which are not known here are written back without changes
+            self._config = config
             #Get required fields
             self.templates = config["templates"]
             self.save_folder_path = config["save_folder_path"]
+            #Optional fields, old config files do not have them
+            self.html_parser = config.get("html_parser", "auto")
+            #How to combine fields which have the same name, key is the name and value is the policy
+            self.aggregation = config.get("aggregation", {})
+            #Engine for writing excel files, "pandas" or "stream"
+            self.excel_engine = config.get("excel_engine", "pandas")
+            #Format of the output files, "xlsx", "csv", "parquet" or "arrow"
+            self.output_format = config.get("output_format", "xlsx")
+            #Max size of the parse cache in megabytes, 0 turns the cache off
+            self.parse_cache_mb = config.get("parse_cache_mb", 64)
+            #Number of exports which are written at the same time
+            self.export_workers = config.get("export_workers", 2)
+            #Max size of the run journal in kilobytes, 0 turns the journal off
+            self.run_journal_kb = config.get("run_journal_kb", 1024)
+            #Save cProfile of every parsing and export to the logs folder
+            self.profile = config.get("profile", False)
+            #Update the existing excel file instead of writing it again, notes of the teacher in the file are kept
+            self.update_existing = config.get("update_existing", False)
+            #Templates for the watched folder, key is a glob pattern of the path in the folder and value is the template name
+            self.watch_rules = config.get("watch_rules", {})
+            #Rules for the fields which are in several merged exports, key is the name and value is the rule
+            self.merge_rules = config.get("merge_rules", {})
+            #Replacement of the marks, key is the mark in the export (not case sensitive) and value is the new mark
+            self.mark_map = config.get("mark_map", {"o": "X"})
+            #Write whole numbers as numbers instead of text
+            self.cast_numbers = config.get("cast_numbers", True)
+
+    #Return config for writing to the config file
+    def to_dict(self):
+        config = dict(self._config)
+        config["save_folder_path"] = self.save_folder_path
+        config["templates"] = self.templates
+        config["html_parser"] = self.html_parser
+        config["aggregation"] = self.aggregation
+        config["excel_engine"] = self.excel_engine
+        config["output_format"] = self.output_format
+        config["parse_cache_mb"] = self.parse_cache_mb
+        config["export_workers"] = self.export_workers
+        config["run_journal_kb"] = self.run_journal_kb
+        config["profile"] = self.profile
+        config["update_existing"] = self.update_existing
+        config["watch_rules"] = self.watch_rules
+        config["merge_rules"] = self.merge_rules
+        config["mark_map"] = self.mark_map
+        config["cast_numbers"] = self.cast_numbers
+        return config
+
+#Time of the stages of one run in milliseconds, time of a stage which is run several times is added up
+class StageTimer:
+    def __init__(self, stages=None):
+        self.stages = dict(stages or {})
+
+    #Measure the code in the with block
+    @contextlib.contextmanager
+    def stage(self, name):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.add(name, (time.perf_counter() - start) * 1000)
+
+    def add(self, name, milliseconds):
+        self.stages[name] = self.stages.get(name, 0) + milliseconds
+
+#Return the peak memory of the process in kilobytes or None if it can not be got
+def get_peak_rss_kb():
+    try:
+        if sys.platform == "win32":
+            import ctypes
+            from ctypes import wintypes
+
+            class ProcessMemoryCounters(ctypes.Structure):
+                _fields_ = [("cb", wintypes.DWORD), ("PageFaultCount", wintypes.DWORD), ("PeakWorkingSetSize", ctypes.c_size_t), ("WorkingSetSize", ctypes.c_size_t), ("QuotaPeakPagedPoolUsage", ctypes.c_size_t), ("QuotaPagedPoolUsage", ctypes.c_size_t), ("QuotaPeakNonPagedPoolUsage", ctypes.c_size_t), ("QuotaNonPagedPoolUsage", ctypes.c_size_t), ("PagefileUsage", ctypes.c_size_t), ("PeakPagefileUsage", ctypes.c_size_t)]
+
+            counters = ProcessMemoryCounters()
+            counters.cb = ctypes.sizeof(counters)
+            get_current_process = ctypes.windll.kernel32.GetCurrentProcess
+            get_current_process.restype = wintypes.HANDLE
+            get_process_memory_info = ctypes.windll.psapi.GetProcessMemoryInfo
+            get_process_memory_info.argtypes = [wintypes.HANDLE, ctypes.POINTER(ProcessMemoryCounters), wintypes.DWORD]
+            if not get_process_memory_info(get_current_process(), ctypes.byref(counters), counters.cb):
+                return None
+            return counters.PeakWorkingSetSize // 1024
+        import resource
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        #macOS gives bytes, Linux gives kilobytes
+        return peak // 1024 if sys.platform == "darwin" else peak
+    except Exception:
+        return None
+
+#Local journal of the runs, every run is one json line, the file is rotated when it is bigger than max size
+#It is used to find out which stage is slow when somebody says that the program was slow
+class RunJournal:
+    def __init__(self, folder, max_size=1024 * 1024, backups=3, is_profile=False):
+        self.folder = folder
+        self.path = os.path.join(folder, "runs.jsonl")
+        self.max_size = max_size
+        self.backups = backups
+        self.is_profile = is_profile
+        #Runs are written by the export queue and by the main thread
+        self._lock = threading.Lock()
+
+    #Add record of the run, time and peak memory of the process are added to it
+    def append(self, record):
+        if self.max_size <= 0:
+            return
+        record = {"time": time.strftime("%Y-%m-%dT%H:%M:%S"), **record}
+        #Runs of the command line are done in other processes, they send their own peak memory
+        record.setdefault("peak_rss_kb", get_peak_rss_kb())
+        if "stages" in record:
+            record["stages"] = {name: round(milliseconds, 2) for name, milliseconds in record["stages"].items()}
+        line = json.dumps(record, ensure_ascii=False) + "\n"
+        with self._lock:
+            #Journal must never break the export, so errors of writing are ignored
+            try:
+                os.makedirs(self.folder, exist_ok=True)
+                if os.path.exists(self.path) and os.path.getsize(self.path) + len(line) > self.max_size:
+                    self._rotate()
+                with open(self.path, "a", encoding="utf-8") as file:
+                    file.write(line)
+            except OSError:
+                pass
+
+    #runs.jsonl -> runs.jsonl.1 -> runs.jsonl.2 ..., the oldest file is deleted
+    def _rotate(self):
+        if self.backups <= 0:
+            os.remove(self.path)
+            return
+        for n in range(self.backups - 1, 0, -1):
+            if os.path.exists(f"{self.path}.{n}"):
+                os.replace(f"{self.path}.{n}", f"{self.path}.{n + 1}")
+        os.replace(self.path, f"{self.path}.1")
+
+    #Run function, if profiling is on it runs under cProfile and the profile is saved to the folder of the journal
+    def run(self, name, function, *args):
+        if not self.is_profile:
+            return function(*args)
+        import cProfile
+        profiler = cProfile.Profile()
+        try:
+            return profiler.runcall(function, *args)
+        finally:
+            os.makedirs(self.folder, exist_ok=True)
+            safe_name = re.sub(r"[^\w.-]", "_", name)
+            profiler.dump_stats(os.path.join(self.folder, f"profile-{time.strftime('%Y%m%d-%H%M%S')}-{safe_name}.prof"))
+
+#Class for the cache of parsed html, file name is the hash of the html and the file has the fields and the grid
+#The least recently used files are deleted when the cache is bigger than max size
+class ParseCache:
+    def __init__(self, folder, max_size):
+        self.folder = folder
+        self.max_size = max_size
+        #Every file starts with the version, files of other versions are deleted when read
+        self._header = f"THC{PARSE_CACHE_VERSION}.{marshal.version}\n".encode()
+
+    #Return the key of the html, cells in the cache are normalized, so the signature of the normalization rules is a part of the key
+    def get_key(self, html, signature=""):
+        key = hashlib.sha256(signature.encode("utf-8"))
+        key.update(html.encode("utf-8", "surrogatepass"))
+        return key.hexdigest()
+
+    #Return (fields list, columns) by the key or None if there is nothing
+    def get(self, key):
+        path = os.path.join(self.folder, f"{key}.bin")
+        try:
+            with open(path, "rb") as file:
+                data = file.read()
+            if not data.startswith(self._header):
+                os.remove(path)
+                return None
+            fields_list, columns = marshal.loads(zlib.decompress(data[len(self._header):]))
+            #Update the time of use of the file
+            os.utime(path)
+        except (OSError, ValueError, EOFError, TypeError, zlib.error):
+            return None
+        return fields_list, columns
+
+    #Save fields list and columns by the key
+    def put(self, key, fields_list, columns):
+        path = os.path.join(self.folder, f"{key}.bin")
+        try:
+            os.makedirs(self.folder, exist_ok=True)
+            #Write to a temporary file and replace, so other processes never read half of the file
+            temp_path = f"{path}.{os.getpid()}.tmp"
+            with open(temp_path, "wb") as file:
+                file.write(self._header + zlib.compress(marshal.dumps((fields_list, columns)), 1))
+            os.replace(temp_path, path)
+            self._evict()
+        except OSError:
+            pass
+
+    #Delete the least recently used files until the cache fits the max size
+    def _evict(self):
+        files = []
+        for entry in os.scandir(self.folder):
+            if entry.name.endswith(".bin"):
+                stat = entry.stat()
+                files.append((stat.st_mtime, stat.st_size, entry.path))
+        total_size = sum(file[1] for file in files)
+        for _, size, path in sorted(files):
+            if total_size <= self.max_size:
+                break
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+            total_size -= size
+
+#Normalization of the cells with marks, rules are compiled once and a whole column is normalized at once
+#Spaces, no-break spaces and other symbols are deleted, then the marks are replaced by mark_map and whole numbers become int
+class CellNormalizer:
+    #Separator of the cells in the joined column, the pattern keeps it
+    _SEPARATOR = "\x1f"
+    #Everything what is not a letter or a number is deleted
+    _COLUMN_PATTERN = re.compile(r"[^\w\x1f]|_")
+    _CELL_PATTERN = re.compile(r"[^\w]|_")
+    _NUMBER_PATTERN = re.compile(r"[0-9]+")
+
+    def __init__(self, mark_map=None, cast_numbers=True):
+        self.mark_map = {"o": "X"} if mark_map is None else mark_map
+        self.cast_numbers = cast_numbers
+        #Marks are cleaned like the cells, so "hyv." in the map matches the cell "hyv."
+        self._marks = {self._CELL_PATTERN.sub("", mark).casefold(): value for mark, value in self.mark_map.items()}
+        #Signature of the rules, it is a part of the key of the parse cache
+        self.signature = hashlib.sha1(json.dumps([sorted(self._marks.items()), self.cast_numbers], ensure_ascii=False).encode("utf-8")).hexdigest()
+
+    #Return list of the normalized texts of the column
+    def normalize_column(self, texts):
+        if len(texts) == 0:
+            return []
+        joined = self._SEPARATOR.join(texts)
+        cleaned = self._COLUMN_PATTERN.sub("", joined).split(self._SEPARATOR)
+        #Some text has the separator itself, so the cells are cleaned one by one
+        if len(cleaned) != len(texts):
+            cleaned = [self._CELL_PATTERN.sub("", text) for text in texts]
+        #Marks repeat a lot, so every different value is normalized once and all cells share the same object
+        values = {value: self._normalize_value(value) for value in set(cleaned)}
+        return list(map(values.__getitem__, cleaned))
+
+    def _normalize_value(self, value):
+        mark = self._marks.get(value.casefold())
+        if mark is not None:
+            return mark
+        if self.cast_numbers and self._NUMBER_PATTERN.fullmatch(value):
+            return int(value)
+        return sys.intern(value)
+
+#Error when parsing was cancelled by the user
+class ParseCancelled(Exception):
+    pass
+
+#Error when the html has no table of the gradebook, no backend could read it
+class ExportFormatError(Exception):
+    pass
 
 #Class parse html and extract the needed information
 class HtmlParcer:
-    def __init__(self, html):
-        #Parse html
-        self.soup = BeautifulSoup(html, "html.parser")
-        self.fields_list = self._parse_fields()
-        self.progress_list = self._parse_progress()
+    #progress is called with a number from 0 to 1, cancel is a threading.Event which stops parsing when set
+    #normalizer is CellNormalizer with the rules from config.json, default rules are used without it
+    def __init__(self, html, backend="auto", cache=None, progress=None, cancel=None, normalizer=None):
+        self._progress = progress
+        self._cancel = cancel
+        self.normalizer = normalizer or CellNormalizer()
+        #If the same html was parsed before, take the fields and the grid from the cache
+        key = cache.get_key(html, self.normalizer.signature) if cache else None
+        cached = cache.get(key) if cache else None
+        if cached:
+            self.backend = "cache"
+            self.fields_list, self.columns = cached
+        else:
+            self.backend, self.fields_list, self.columns = self._parse(html, backend)
+            if cache:
+                cache.put(key, self.fields_list, self.columns)
+        self.rows_count = len(self.columns[0])
+
+    #Return the name of the used backend, the list of fields and the grid with one column of values per field
+    #The parse tree is not saved
+    def _parse(self, html, backend):
+        #Try backends one by one, if the fast one is not installed or cannot read the html use the next one
+        for name in self._get_backends(backend):
+            try:
+                #Every backend returns the data-tooltip of every field, the cells of every row and the number of rows
+                #Cell is a tuple (text of the link or None if there is no link, text of the cell)
+                tooltips, rows, rows_count = getattr(self, f"_parse_with_{name.replace('.', '_')}")(html)
+                fields_list = self._parse_fields(tooltips)
+                columns = self._parse_columns(rows, rows_count, len(fields_list))
+            except ParseCancelled:
+                raise
+            except Exception as error:
+                if name == "html.parser":
+                    raise ExportFormatError("html is not a gradebook export") from error
+                continue
+            return name, fields_list, columns
+
+    #Return the list of backends to try, the selected one goes first and html.parser is always last
+    def _get_backends(self, backend):
+        backends = [name for name in HTML_PARSER_BACKENDS if name == "html.parser" or importlib.util.find_spec(name)]
+        if backend in backends:
+            backends.remove(backend)
+            backends.insert(0, backend)
+        return backends
+
+    #Parse with selectolax
+    def _parse_with_selectolax(self, html):
+        from selectolax.lexbor import LexborHTMLParser
+        tree = LexborHTMLParser(html)
+        tooltips = [th.attributes.get("data-tooltip") for th in tree.css_first("thead").css("th.center")]
+        row_tags = tree.css_first("tbody").css("tr")
+        rows = (
+            [(link.text() if (link := element.css_first("a")) else None, element.text()) for element in row.css("td")]
+            for row in row_tags
+        )
+        return tooltips, rows, len(row_tags)
+
+    #Parse with lxml
+    def _parse_with_lxml(self, html):
+        import lxml.html
+        tree = lxml.html.document_fromstring(html)
+        head = tree.find(".//thead")
+        tooltips = [th.get("data-tooltip") for th in head.iter("th") if "center" in th.get("class", "").split()]
+        row_tags = list(tree.find(".//tbody").iter("tr"))
+        rows = (
+            [(link.text_content() if (link := element.find(".//a")) is not None else None, element.text_content()) for element in row.iter("td")]
+            for row in row_tags
+        )
+        return tooltips, rows, len(row_tags)
+
+    #Parse with BeautifulSoup and the built-in html.parser
+    def _parse_with_html_parser(self, html):
+        from bs4 import BeautifulSoup, SoupStrainer
+        #Only thead and tbody are needed, so the rest of the page is not built into the tree
+        soup = BeautifulSoup(html, "html.parser", parse_only=SoupStrainer(["thead", "tbody"]))
+        tooltips = [th_tag.get('data-tooltip') for th_tag in soup.thead.find_all("th", class_='center')]
+        row_tags = soup.tbody.find_all("tr")
+        rows = (
+            [(element.a.text if element.find("a") else None, element.text) for element in row.find_all("td")]
+            for row in row_tags
+        )
+        return tooltips, rows, len(row_tags)
 
     #Function return a list of fields
-    def _parse_fields(self):
-        #Search th tags in the thead, there are located fields
-        th_tags =  self.soup.thead.find_all("th", class_='center')
+    def _parse_fields(self, tooltips):
         #Array for fields, names of students is required, so we create it immediately.
         list = ["Opiskelijan nimi"]
 
-        #Loop iterate through th tags
-        for th_tag in th_tags:
-            #Get the data-tooltip parameter which contains details about field
-            data_tooltip = th_tag.get('data-tooltip')
+        #Loop iterate through data-tooltip parameters of th tags, they contain details about field
+        for data_tooltip in tooltips:
             #Remove unnecessary symbols
             data_dict = json.loads(data_tooltip.replace('&quot;', ''))
             #Extract the parameter in which the name is located
@@ -122,47 +652,232 @@ class HtmlParcer:
             list.append(fields_name)
         return(list)
 
-    #parse merits students, they are all found in tr tag
-    def _parse_progress(self):
-        return self.soup.tbody.find_all("tr")
+    #Students progress is in the rows, go through them once and put every value to the column of its field
+    def _parse_columns(self, rows, rows_count, fields_count):
+        #Building the tree is the first part of the work, reading the rows is the second part
+        self._report_progress(0.3)
+        #Texts of the cells by column, names and metrits are in different tags,
+        #so the texts of the links (names of the students) are kept apart as (row, text) and are not normalized
+        texts = [[] for _ in range(fields_count)]
+        links = [[] for _ in range(fields_count)]
+        for n,row in enumerate(rows):
+            if n % 50 == 0:
+                self._report_progress(0.3 + 0.7 * n / max(rows_count, 1))
+            #Skip first row
+            if n == 0:
+                continue
+            for idx, column in enumerate(texts):
+                #If the row is shorter than the header, the value is empty
+                if idx < len(row):
+                    link_text, text = row[idx]
+                    if link_text is not None:
+                        links[idx].append((len(column), link_text))
+                    column.append(text)
+                else:
+                    column.append("")
+
+        columns = []
+        for column, column_links in zip(texts, links):
+            if len(column_links) == len(column):
+                column = [link_text for _, link_text in column_links]
+            else:
+                column = self.normalizer.normalize_column(column)
+                for n, link_text in column_links:
+                    column[n] = link_text
+            columns.append(tuple(column))
+        return columns
+
+    #Send progress to the callback and stop, if parsing was cancelled
+    def _report_progress(self, value):
+        if self._cancel and self._cancel.is_set():
+            raise ParseCancelled()
+        if self._progress:
+            self._progress(value)
+
+#Several parsed exports joined into one by the name of the student, for example when the students of one class are in several groups
+#It has the same fields_list, columns and rows_count as HtmlParcer, so it is processed and written the same way
+class ExportMerger:
+    #Rules for a field which is in several exports: "first" or "last" not empty value, "max" the biggest number
+    RULES = ["first", "last", "max"]
+
+    def __init__(self, parsers, rules=None):
+        #Rule by the name of the field, "first" is used for the other fields
+        self.rules = rules or {}
+        self.check_rules(self.rules)
+        self.backend = "merge"
+        self._merge(parsers)
+
+    #Raise ValueError with the name of the field if a rule is wrong, a typo must not work as "first" silently
+    @classmethod
+    def check_rules(cls, rules):
+        for field, rule in rules.items():
+            if rule not in cls.RULES:
+                raise ValueError(f"Wrong merge rule of {field}: {rule}")
+
+    def _merge(self, parsers):
+        #Row of every student in the merged table, key is (name, number of the same name before it in its export),
+        #so two students with the same name in one export are not joined into one
+        student_rows = {}
+        names = []
+        #Column of every field, key is (name, number of the same field before it in its export),
+        #fields with the same name in one export stay separate columns, like in one export
+        field_columns = {}
+        self.fields_list = ["Opiskelijan nimi"]
+        columns = []
+
+        for parser in parsers:
+            #Rows of this export in the merged table
+            rows = []
+            seen = {}
+            for name in parser.columns[0]:
+                key = (name, seen.get(name, 0))
+                seen[name] = key[1] + 1
+                if key not in student_rows:
+                    student_rows[key] = len(names)
+                    names.append(name)
+                    for column in columns:
+                        column.append("")
+                rows.append(student_rows[key])
+
+            seen = {}
+            for field, values in zip(parser.fields_list[1:], parser.columns[1:]):
+                key = (field, seen.get(field, 0))
+                seen[field] = key[1] + 1
+                if key not in field_columns:
+                    field_columns[key] = len(columns)
+                    self.fields_list.append(field)
+                    columns.append([""] * len(names))
+                column = columns[field_columns[key]]
+                rule = self.rules.get(field, "first")
+                for row, value in zip(rows, values):
+                    column[row] = self._resolve(column[row], value, rule)
+
+        self.columns = [tuple(names)] + [tuple(column) for column in columns]
+        self.rows_count = len(names)
+
+    #Return the value of the field which is in two exports
+    def _resolve(self, old, new, rule):
+        if new == "":
+            return old
+        if old == "" or rule == "last":
+            return new
+        if rule == "max":
+            #Number wins over a mark like "S" or "X", so the result does not depend on the order of the files
+            old_number = self._to_number(old)
+            new_number = self._to_number(new)
+            if new_number is None:
+                return old
+            if old_number is None or new_number > old_number:
+                return new
+        return old
+
+    #Return the value as float or None if it is not a number
+    def _to_number(self, value):
+        try:
+            return float(value)
+        except (TypeError, ValueError):
+            return None
+
+#Cache of compiled plans, plan is a list of (column index, name in the table) for the selected fields
+#Plans are kept by the fingerprint of the fields of the export, so the same layout is matched only once
+class FieldPlanCache:
+    def __init__(self, max_size=64):
+        self.max_size = max_size
+        #Indexes of the fields by name for every fingerprint
+        self._fields = {}
+        self._plans = {}
+        #Plans are used by the export queue and by the main thread
+        self._lock = threading.Lock()
+
+    #Return the fingerprint of the fields of the export
+    def get_fingerprint(self, fields_list):
+        return hashlib.sha1("\x1f".join(fields_list).encode("utf-8", "surrogatepass")).hexdigest()
+
+    #Return the plan for the selected fields, it is compiled if it is not in the cache
+    def get(self, fields_list, selected_fields):
+        fingerprint = self.get_fingerprint(fields_list)
+        key = (fingerprint, tuple(tuple(field) for field in selected_fields))
+        with self._lock:
+            plan = self._plans.pop(key, None)
+            if plan is None:
+                if fingerprint not in self._fields:
+                    if len(self._fields) >= self.max_size:
+                        del self._fields[next(iter(self._fields))]
+                    self._fields[fingerprint] = self._index_fields(fields_list)
+                plan = self.compile(self._fields[fingerprint], selected_fields)
+                #The oldest plan is deleted when there are too many
+                if len(self._plans) >= self.max_size:
+                    del self._plans[next(iter(self._plans))]
+            #The used plan is moved to the end, so it is deleted last
+            self._plans[key] = plan
+        return plan
+
+    #Return indexes of the fields by name, the same name can be used by several fields
+    @staticmethod
+    def _index_fields(fields_list):
+        indexes = {}
+        for n, field in enumerate(fields_list):
+            indexes.setdefault(field, []).append(n)
+        return indexes
+
+    #Match the selected fields to the columns, the fields which are not in the export are skipped
+    #If several fields have the same name, each of them gets its own column in the same order
+    @staticmethod
+    def compile(indexes, selected_fields):
+        used = {}
+        plan = []
+        for field in selected_fields:
+            columns = indexes.get(field[0], ())
+            n = used.get(field[0], 0)
+            if n < len(columns):
+                plan.append((columns[n], field[-1]))
+                used[field[0]] = n + 1
+        return plan
 
 #Data processing takes place in this class
 class DataManager:
-    def __init__(self, app):
-        self.checkboxes_list = app.gui.checkboxes_list
-        self.entry_list = app.gui.entry_list
-        self.parser = app.html_parser
-        self.config = app.config_manager
-        self.selected_fields = self._initialize_selected_fields()
+    #Policies of combining the fields which have the same name
+    POLICIES = ["sum", "max", "count_x", "first"]
+
+    def __init__(self, parser, config, selected_fields, plans=None):
+        self.parser = parser
+        self.config = config
+        #Array of selected fields, which contains other arrays
+        #First element is the actual name of the field and the second is the desired name
+        self.selected_fields = selected_fields
+        #Cache of the plans, without it the plan is compiled every time
+        self.plans = plans
+        #Processed table, columns by name, it is None until the data is processed
+        self.table = None
+        #Several exports of the same data can be run at the same time, the data is processed once
+        self._lock = threading.Lock()
     
     #Prepares data for _process_data function
     def process_data(self, new_selected_fields = None):
         #If nothing was selected then stop function
         if(new_selected_fields):
             self.selected_fields = new_selected_fields
-        self.table = self._initialize_table()
-        self.indexes_list = self._initialize_indexes()
-        self._process_data()
+        table = self._initialize_table()
+        self.plan = self._initialize_plan()
+        self._process_data(table)
+        self.table = table
 
-    #Initializes an array of selected industries, which contains other arrays
-    #First element is the actual name of the field and the second is the desired name
-    def _initialize_selected_fields(self):
-        #Names of the students must be, so we create them
-        fields_list = [["Opiskelijan nimi"]]
+    #Return the table, the data is processed only the first time
+    #If order (names of the columns) is given, the columns are only put in that order, the data is not processed again
+    def get_table(self, order=None):
+        with self._lock:
+            if self.table is None:
+                self.process_data()
+        if order is None:
+            return self.table
+        return self.reorder(order)
+
+    #Return the table with the columns in the given order, names of students are always first
+    #Columns which are not in the order are put at the end
+    def reorder(self, order):
+        names = dict.fromkeys(["Opiskelijan nimi", *order, *self.table])
+        return {name: self.table[name] for name in names if name in self.table}
 
-        #loop iterate through all the checkboxes
-        for n,i in enumerate(self.checkboxes_list):
-            #Check if checkbox selected
-            if i.get() == 1:
-                #get checkbox text
-                element = [i.cget("text")]
-                #check if input not empty
-                if len(self.entry_list[n].get()) != 0:
-                    #get text from input
-                    element.append(self.entry_list[n].get())
-                #append element to fields list array
-                fields_list.append(element)
-        return fields_list
     #Initialization of the table that will later be filled and written in excel
     def _initialize_table(self):
         table = {}
@@ -173,151 +888,507 @@ class DataManager:
             table[i[-1]] = []
         return table
 
-    #initialization of the list of indexes of the fields that we need
-    def _initialize_indexes(self):
-        indexes_list = []
-        for i in self.selected_fields:
-            if i[0] in self.parser.fields_list:
-                indexes_list.append(self.parser.fields_list.index(i[0]))
-        return indexes_list
-
-    #Function delete not needed spaces from string
-    def _delete_spaces(self, text):
-        return ''.join(char for char in text if char.isalnum())
+    #Initialization of the plan, list of (column index, name in the table) of the fields that we need
+    def _initialize_plan(self):
+        if self.plans is None:
+            return FieldPlanCache.compile(FieldPlanCache._index_fields(self.parser.fields_list), self.selected_fields)
+        return self.plans.get(self.parser.fields_list, self.selected_fields)
 
     #Main function that write data in a table
-    def _process_data(self):
-        #Loop iterate students progress list
-        for n,row in enumerate(self.parser.progress_list):
-            #Skip first element
-            if n == 0:
-                continue
-            #Get all row
-            elements = row.find_all("td")
-            #Loop iterate indexes list
-            for idx, selected_index in enumerate(self.indexes_list):
-                field_name = self.selected_fields[idx][-1]
-                element = elements[selected_index]
-                #Names and metrits are in different tags, so need to check where to pull the text from
-                value = element.a.text if element.find("a") else self._delete_spaces(element.text)
-                #Replase o to X
-                value = "X" if value.lower() == "o" else value
-                self.table[field_name].append(value)
-
-        #Loop is combine fields with the same name
-        for i in self.table:
-            #Code above adds the same data with the same name to the same array,
-            #so we may end up with all arrays having a length of 12 and one having a length of 24 or 36
-            #Check with the name array because it is always same
-            #We check the length of the array of names, so it is always the correct length
-            if len(self.table[i]) % len(self.table["Opiskelijan nimi"]) == 0 and len(self.table[i]) != len(self.table["Opiskelijan nimi"]):
-                list = self.table[i]
-                #Variable where we write how many times the array is larger than we need
-                step = int(len(list) / len(self.table["Opiskelijan nimi"]))
-                #New array that will be shorter by reducing it by 'step'
-                new_array=[]
-                #Loop iterate list by a step
-                for j in range(0, len(list),step):
-                    #Get a slice of the list based on the step
-                    current_elements = list[j:j + step]
-                    new_element = ""
-                    #Add up the elements in the current slice, skipping empty values
-                    for k in current_elements:
-                        if k != "":
-                            if new_element == "":
-                                new_element = int(k)
-                            else:
-                                new_element = new_element + int(k)
-                    #Add the summed up value to the new array
-                    new_array.append(new_element)
-                #Replace the old array with the new one
-                self.table[i] = new_array
-
-#Class for writing data in Excel and styling
-class ExcelWriter:
-    def __init__(self, table, total_lines, folder_path, filename="students"):
+    def _process_data(self, table):
+        #The parser already has a column of values for every field, so just take the selected ones
+        columns = {}
+        for column_index, field_name in self.plan:
+            columns.setdefault(field_name, []).append(self.parser.columns[column_index])
+
+        for field_name in columns:
+            if len(columns[field_name]) == 1:
+                table[field_name] = list(columns[field_name][0])
+            #Several fields have the same name, so combine them into one column
+            else:
+                policy = self.config.aggregation.get(field_name, "sum")
+                #Wrong policy must not be summed silently, the export fails with the name of the field
+                if policy not in self.POLICIES:
+                    raise ValueError(f"Wrong aggregation policy of {field_name}: {policy}")
+                table[field_name] = self._aggregate(columns[field_name], policy)
+
+    #Combine several columns into one, the whole columns are processed at once
+    #Policies: "sum" and "max" of the numbers, "count_x" count of the X marks, "first" first not empty value
+    def _aggregate(self, columns, policy):
+        import numpy as np
+        import pandas as pd
+        #Array where row is a source field and column is a student
+        values = np.array(columns, dtype=object)
+        if policy == "count_x":
+            return (values == "X").sum(axis=0).tolist()
+        if policy == "first":
+            not_empty = values != ""
+            first = values[not_empty.argmax(axis=0), np.arange(values.shape[1])]
+            return np.where(not_empty.any(axis=0), first, "").tolist()
+
+        #Blank and not numeric marks become NaN and are skipped
+        numbers = pd.to_numeric(pd.Series(values.ravel()), errors="coerce").to_numpy(dtype=float).reshape(values.shape)
+        missing = np.isnan(numbers)
+        if policy == "max":
+            result = np.where(missing, -np.inf, numbers).max(axis=0)
+        else:
+            result = np.where(missing, 0, numbers).sum(axis=0)
+
+        #Students without any number get an empty value, whole numbers are written without .0
+        combined = np.full(values.shape[1], "", dtype=object)
+        has_number = ~missing.all(axis=0)
+        result = np.where(has_number, result, 0)
+        is_whole = has_number & (np.mod(result, 1) == 0)
+        combined[has_number] = result[has_number].tolist()
+        combined[is_whole] = result[is_whole].astype(np.int64).tolist()
+        return combined.tolist()
+
+#Base class of the writers of the output files, the file is written when the object is created
+#Every writer keeps the order of the columns of the table and adds empty rows up to total_lines
+class OutputWriter:
+    #Extension of the files of the writer
+    extension = ""
+
+    #engine and update are used only by the excel writer, other writers take them so all writers are created the same way
+    #If file (binary file object) is given, the output is written to it instead of the folder, so the service keeps it in memory
+    def __init__(self, table, total_lines, folder_path, filename="students", engine="pandas", update=False, file=None):
         self.table = table
-        self.df = pd.DataFrame(table)
-        self.total_lines = total_lines
         self.folder_path = folder_path
         self.filename = filename
-        #if need, add empty rows
-        if  len(self.df) < self.total_lines:
+        self.path = self.get_path(folder_path, filename) if file is None else file
+        self.engine = engine
+        #Existing file can be updated only on the disk
+        self.update = update and file is None
+        #Time of the stages of writing, it is added to the run journal
+        self.timer = StageTimer()
+        #Number of cells which were written by the update, None when the file was written from scratch
+        self.changed_cells = None
+        with self.timer.stage("write_file"):
+            self._write(table, total_lines)
+
+    #Return path to the file, if folder_path is empty the file is saved next to the program
+    @classmethod
+    def get_path(cls, folder_path, filename):
+        return f"{folder_path}/{filename}.{cls.extension}" if folder_path else f"{filename}.{cls.extension}"
+
+    def _write(self, table, total_lines):
+        raise NotImplementedError
+
+    #Return the number of rows in the file without the header, the table is padded with empty rows to total_lines
+    def _get_rows_count(self, table, total_lines):
+        columns = list(table.values())
+        return max(len(columns[0]) if columns else 0, total_lines)
+
+#Class for writing a table to a csv file, rows are written one by one without building a DataFrame
+class CsvWriter(OutputWriter):
+    extension = "csv"
+
+    def _write(self, table, total_lines):
+        import csv
+        columns = list(table.values())
+        rows_count = len(columns[0]) if columns else 0
+        #Excel opens the file with the right encoding only when it starts with BOM
+        if isinstance(self.path, str):
+            file = open(self.path, "w", encoding="utf-8-sig", newline="")
+        else:
+            import io
+            file = io.TextIOWrapper(self.path, encoding="utf-8-sig", newline="")
+        try:
+            writer = csv.writer(file)
+            writer.writerow(table)
+            writer.writerows(zip(*columns))
+            writer.writerows([[""] * len(columns)] * (self._get_rows_count(table, total_lines) - rows_count))
+        finally:
+            #File object of the caller is not closed
+            if isinstance(self.path, str):
+                file.close()
+            else:
+                file.flush()
+                file.detach()
+
+#Class for writing a table to a parquet file, the file is columnar and it is read back much faster than excel
+#pyarrow is not required by the program, it must be installed to use this writer
+class ParquetWriter(OutputWriter):
+    extension = "parquet"
+
+    def _write(self, table, total_lines):
+        arrow_table = self._create_arrow_table(table, total_lines)
+        import pyarrow.parquet as pq
+        pq.write_table(arrow_table, self.path)
+
+    #Return arrow table, empty cells are nulls and a column has numbers only when all its values are numbers
+    def _create_arrow_table(self, table, total_lines):
+        try:
+            import pyarrow as pa
+        except ImportError:
+            raise ImportError("pyarrow is needed for parquet and arrow files: pip install pyarrow")
+        rows_count = self._get_rows_count(table, total_lines)
+        arrays = []
+        for column in table.values():
+            values = [None if value == "" else value for value in column] + [None] * (rows_count - len(column))
+            if all(value is None or type(value) is int for value in values):
+                arrays.append(pa.array(values, type=pa.int64()))
+            else:
+                arrays.append(pa.array([None if value is None else str(value) for value in values], type=pa.string()))
+        return pa.Table.from_arrays(arrays, names=list(table))
+
+#Class for writing a table to an arrow (feather v2) file, it is read by pandas or pyarrow without any conversion
+class ArrowWriter(ParquetWriter):
+    extension = "arrow"
+
+    def _write(self, table, total_lines):
+        arrow_table = self._create_arrow_table(table, total_lines)
+        import pyarrow.ipc as ipc
+        #IPC writer takes a path or a file object
+        with ipc.new_file(self.path, arrow_table.schema) as writer:
+            writer.write_table(arrow_table)
+
+#Class for writing data in Excel and styling
+class ExcelWriter(OutputWriter):
+    extension = "xlsx"
+    #Header is the first row, so the data rows with an even number in excel are filled
+    _ZEBRA_FORMULA = "MOD(ROW(),2)=0"
+
+    def _write(self, table, total_lines):
+        self._write_workbook([("Table", table, total_lines)])
+
+    #Write every sheet (name, table, total lines) to one excel file
+    #If update is True and the file exists, only the changed cells of the file are written
+    def _write_workbook(self, sheets):
+        #Styles are created once and used for every sheet
+        self._cell_style, self._zebra_fill = self._create_styles()
+        if self.update and os.path.exists(self.path):
+            self._update_workbook(sheets)
+        #Stream engine writes rows straight to the file without building a DataFrame
+        elif self.engine == "stream":
+            self._write_stream(sheets)
+        else:
+            self._write_to_excel(sheets)
+
+    #Return DataFrame of the table, if need, add empty rows
+    def _create_frame(self, table, total_lines):
+        import pandas as pd
+        df = pd.DataFrame(table)
+        if  len(df) < total_lines:
             #Number of required empty rows to be added
-            empty_rows = self.total_lines - len(self.df)
+            empty_rows = total_lines - len(df)
             #Array of empty elements
-            empty_data = pd.DataFrame([[""] * len(self.df.columns)] * empty_rows, columns=self.df.columns)
+            empty_data = pd.DataFrame([[""] * len(df.columns)] * empty_rows, columns=df.columns)
             #Combine dataframes
-            self.df = pd.concat([self.df, empty_data], ignore_index=True)
-        self._write_to_excel()
-
-    #Function write the table to an excel file.
-    def _write_to_excel(self):
-        #Path to the folder to save to
-        folder_path = ""
-        #If folder_path not empty
-        if self.folder_path:
-            #Add / because its path
-            folder_path = self.folder_path+"/"
+            df = pd.concat([df, empty_data], ignore_index=True)
+        return df
+
+    #Function write the tables to an excel file.
+    def _write_to_excel(self, sheets):
+        import pandas as pd
         #Save and open excel file for styling
-        with pd.ExcelWriter(f"{folder_path}{self.filename}.xlsx", engine='openpyxl') as writer:
-            #Get sheets from table
-            self.df.to_excel(writer, sheet_name='Table', index=False)
-            #Get current sheet from table
-            work_sheet = writer.sheets['Table']
-            self._adjust_columns(work_sheet)
-            self._apply_styles(work_sheet)
-
-    #Function sets column the width, which depends on the maximum width
-    def _adjust_columns(self, sheet):
+        with pd.ExcelWriter(self.path, engine='openpyxl') as writer:
+            writer.book.add_named_style(self._cell_style)
+            for sheet_name, table, total_lines in sheets:
+                with self.timer.stage("build_frame"):
+                    frame = self._create_frame(table, total_lines)
+                #Get sheets from table
+                with self.timer.stage("write_cells"):
+                    frame.to_excel(writer, sheet_name=sheet_name, index=False)
+                #Get current sheet from table
+                work_sheet = writer.sheets[sheet_name]
+                with self.timer.stage("adjust_columns"):
+                    self._adjust_columns(work_sheet, self._plan_column_widths(table))
+                with self.timer.stage("apply_styles"):
+                    self._apply_styles(work_sheet)
+            #File is saved when the writer is closed
+            save_start = time.perf_counter()
+        self.timer.add("save_file", (time.perf_counter() - save_start) * 1000)
+
+    #Function write the tables to an excel file row by row, style is added when the row is written
+    def _write_stream(self, sheets):
+        from openpyxl import Workbook
+        from openpyxl.cell import WriteOnlyCell
+        work_book = Workbook(write_only=True)
+        work_book.add_named_style(self._cell_style)
+        style_name = self._cell_style.name
+        for sheet_name, table, total_lines in sheets:
+            work_sheet = work_book.create_sheet(sheet_name)
+            columns = list(table.values())
+            rows_count = len(columns[0]) if columns else 0
+
+            #In the write only mode the width must be set before the rows
+            with self.timer.stage("adjust_columns"):
+                self._adjust_columns(work_sheet, self._plan_column_widths(table))
+
+            write_start = time.perf_counter()
+            work_sheet.append(list(table))
+            #Rows from the table and then empty rows, if need
+            rows = zip(*columns)
+            empty_row = [""] * len(columns)
+            for n in range(max(rows_count, total_lines)):
+                row = next(rows) if n < rows_count else empty_row
+                cells = []
+                for value in row:
+                    cell = WriteOnlyCell(work_sheet, value=None if value == "" else value)
+                    cell.style = style_name
+                    cells.append(cell)
+                work_sheet.append(cells)
+            #Style is set on the cells when they are written, so it is a part of this stage
+            self.timer.add("write_cells", (time.perf_counter() - write_start) * 1000)
+            self._add_zebra(work_sheet, len(columns), max(rows_count, total_lines) + 1)
+        with self.timer.stage("save_file"):
+            work_book.save(self.path)
+
+    #Update the existing excel file, rows are matched by the name of the student and columns by the header
+    #Only the cells with other values are written, so the notes of the teacher, styles and other columns are kept
+    def _update_workbook(self, sheets):
+        from openpyxl import load_workbook
+        with self.timer.stage("load_file"):
+            work_book = load_workbook(self.path)
+        #Files written by this program have the style already
+        if self._cell_style.name not in work_book.named_styles:
+            work_book.add_named_style(self._cell_style)
+        self.changed_cells = 0
+        with self.timer.stage("update_cells"):
+            for sheet_name, table, total_lines in sheets:
+                if sheet_name in work_book.sheetnames:
+                    self.changed_cells += self._update_sheet(work_book[sheet_name], table)
+                #File has one table, but the teacher could rename the sheet
+                elif len(sheets) == 1:
+                    self.changed_cells += self._update_sheet(work_book.worksheets[0], table)
+                else:
+                    self.changed_cells += self._update_sheet(work_book.create_sheet(sheet_name), table, total_lines)
+        #File is saved to a temporary file first, so the old file is not broken if saving fails
+        with self.timer.stage("save_file"):
+            tmp_path = f"{self.path}.tmp"
+            work_book.save(tmp_path)
+            os.replace(tmp_path, self.path)
+
+    #Write the changed cells of the table to the sheet and return the number of them
+    #Rows of the students which are not in the sheet are added after the last student
+    def _update_sheet(self, sheet, table, total_lines=0):
+        from copy import copy
+        from openpyxl.utils import get_column_letter
+        style_name = self._cell_style.name
+        names = list(table)
+        #Rows of the sheet before the update, with the empty styled rows at the end
+        old_max_row = sheet.max_row
+
+        #Columns of the sheet by header
+        header_columns = {}
+        for cell in sheet[1]:
+            if cell.value is not None:
+                header_columns.setdefault(str(cell.value), cell.column)
+        #Names of the students are in the first column, even if the teacher renamed its header
+        if header_columns and names and names[0] not in header_columns:
+            header_columns[names[0]] = 1
+        changed = 0
+        #Columns of the table which are not in the sheet are added after the last column,
+        #they get the width of the new file and the style of the first header
+        next_column = max(header_columns.values(), default=0) + 1
+        widths = self._plan_column_widths(table)
+        new_columns = []
+        for n, name in enumerate(names):
+            if name not in header_columns:
+                cell = sheet.cell(1, next_column, name)
+                if header_columns:
+                    header_cell = sheet.cell(1, min(header_columns.values()))
+                    cell.font = copy(header_cell.font)
+                    cell.border = copy(header_cell.border)
+                    cell.alignment = copy(header_cell.alignment)
+                sheet.column_dimensions[get_column_letter(next_column)].width = widths[n]
+                header_columns[name] = next_column
+                new_columns.append(next_column)
+                next_column += 1
+                changed += 1
+        columns = [header_columns[name] for name in names]
+        #Cells of the new columns in the old rows get the style of the table, like the other cells of these rows
+        for row in range(2, old_max_row + 1):
+            for column in new_columns:
+                sheet.cell(row, column).style = style_name
+
+        #Rows of the sheet by the name of the student, the same name can be in several rows
+        name_column = columns[0]
+        name_rows = {}
+        last_row = 1
+        for (value,) in sheet.iter_rows(min_row=2, min_col=name_column, max_col=name_column, values_only=True):
+            last_row += 1
+            if value not in (None, ""):
+                name_rows.setdefault(str(value), []).append(last_row)
+        #Empty rows at the end are used for the new students
+        while last_row > 1 and sheet.cell(last_row, name_column).value in (None, ""):
+            last_row -= 1
+
+        values = list(table.values())
+        rows_count = len(values[0]) if values else 0
+        first_new_row = last_row + 1
+        for n in range(rows_count):
+            student = values[0][n]
+            rows = name_rows.get(str(student))
+            if rows:
+                row = rows.pop(0)
+                is_new = False
+            else:
+                last_row += 1
+                row = last_row
+                is_new = True
+            for column, column_values in zip(columns, values):
+                value = column_values[n] if n < len(column_values) else ""
+                value = None if value == "" else value
+                cell = sheet.cell(row, column)
+                if is_new:
+                    cell.style = style_name
+                if cell.value != value:
+                    cell.value = value
+                    changed += 1
+
+        #New sheet gets empty styled rows like a new file
+        for row in range(last_row + 1, total_lines + 2):
+            for column in columns:
+                sheet.cell(row, column).style = style_name
+        self._add_missing_zebra(sheet, columns, new_columns, first_new_row, max(last_row, total_lines + 1, old_max_row))
+        return changed
+
+    #Stripe the new rows (all columns of the table) and the new columns (all rows), the old cells keep their styles
+    #Cells which are already in a zebra rule of the sheet are skipped, so the rules do not pile up after every update
+    def _add_missing_zebra(self, sheet, columns, new_columns, first_new_row, last_row):
+        from openpyxl.utils import get_column_letter
+        covered = [cell_range for formatting in sheet.conditional_formatting
+                   if any(rule.formula == [self._ZEBRA_FORMULA] for rule in formatting.rules)
+                   for cell_range in formatting.sqref.ranges]
+        table_columns = sorted(set(columns))
+        #Blocks of rows with the same missing columns [first row, last row, columns]
+        blocks = []
+        for row in range(2 if new_columns else first_new_row, last_row + 1):
+            row_columns = table_columns if row >= first_new_row else new_columns
+            missing = [column for column in row_columns
+                       if not any(cell_range.min_row <= row <= cell_range.max_row and cell_range.min_col <= column <= cell_range.max_col for cell_range in covered)]
+            if blocks and blocks[-1][1] == row - 1 and blocks[-1][2] == missing:
+                blocks[-1][1] = row
+            else:
+                blocks.append([row, row, missing])
+        ranges = []
+        for first_row, last_block_row, missing in blocks:
+            #Columns next to each other are in one range
+            spans = []
+            for column in missing:
+                if spans and spans[-1][1] == column - 1:
+                    spans[-1][1] = column
+                else:
+                    spans.append([column, column])
+            ranges += [f"{get_column_letter(first)}{first_row}:{get_column_letter(last)}{last_block_row}" for first, last in spans]
+        if ranges:
+            self._add_zebra(sheet, ranges=" ".join(ranges))
+
+    #Return the width of every column, it depends on the longest text in the column
+    #Widths are computed from the table before writing, so every engine can use them
+    def _plan_column_widths(self, table):
+        import pandas as pd
         #Min width of column
         base_width = 10
-        #List for max widths of columns
-        column_widths = {}
-        #Loop iterate columns and put column width to list
-        for column in sheet.columns:
-            max_length = 0
-            #Get the letter of the current column
-            column_letter = column[0].column_letter
-            for cell in column:
-                try:
-                    #If the cell text is longer than current max, update it
-                    if len(str(cell.value)) > max_length:
-                        max_length = len(cell.value)
-                except:
-                    pass
-            #Save the max length for the column
-            column_widths[column_letter] = max_length
-        #set width for A
-        if 'A' in column_widths:
-            sheet.column_dimensions['A'].width = column_widths['A']
-
-        #Find the max width for all columns except 'A'
-        max_width_for_others = max(width for letter, width in column_widths.items() if letter != 'A')
-        #Set max width for other
-        for column_letter in column_widths:
-            if column_letter != 'A':
-                sheet.column_dimensions[column_letter].width = max(max_width_for_others, base_width)
+        widths = []
+        for name, column in table.items():
+            #Length of every value at once, header is counted too
+            lengths = pd.Series(column, dtype=object).astype(str).str.len()
+            widths.append(max(len(str(name)), int(lengths.max()) if len(lengths) else 0))
+        #First column has names of students, it gets its own width, the other columns get the same width
+        if len(widths) < 2:
+            return widths
+        max_width_for_others = max(max(widths[1:]), base_width)
+        return [widths[0]] + [max_width_for_others] * (len(widths) - 1)
+
+    #Function sets the width of the columns
+    def _adjust_columns(self, sheet, column_widths):
+        from openpyxl.utils import get_column_letter
+        for n, width in enumerate(column_widths):
+            sheet.column_dimensions[get_column_letter(n + 1)].width = width
 
     #Add styles to the table, such as border and fill
     def _apply_styles(self, sheet):
-        #Gray color fill
+        style_name = self._cell_style.name
+
+        #Border and alignment are in one named style, so the cell gets only the number of the style
+        for row in sheet.iter_rows(min_row=2, max_row=sheet.max_row):
+            for cell in row:
+                cell.style = style_name
+        self._add_zebra(sheet, sheet.max_column, sheet.max_row)
+
+    #Fill the rows with a step with gray color, it is one rule of conditional formatting for the whole range,
+    #so the size of the file and the time do not grow with the number of cells
+    #ranges are excel ranges separated by spaces, if they are not given the table from the second row is used
+    def _add_zebra(self, sheet, max_column=0, max_row=0, ranges=None):
+        from openpyxl.formatting.rule import FormulaRule
+        from openpyxl.utils import get_column_letter
+        if ranges is None:
+            if max_column == 0 or max_row < 2:
+                return
+            ranges = f"A2:{get_column_letter(max_column)}{max_row}"
+        sheet.conditional_formatting.add(ranges, FormulaRule(formula=[self._ZEBRA_FORMULA], fill=self._zebra_fill))
+
+    #Return named style of the table cells and the fill of the rows
+    def _create_styles(self):
+        from copy import copy
+        from openpyxl.styles import DEFAULT_FONT, NamedStyle, PatternFill, Border, Side, Alignment
+        #Gray color fill, conditional formatting uses the end (background) color of the solid fill
         fill = PatternFill(start_color="828181", end_color="828181", fill_type='solid')
-        border = Border(
+        #Named style has an empty font by default, cells keep the font of the workbook
+        cell_style = NamedStyle(name="Table cell", font=copy(DEFAULT_FONT))
+        cell_style.border = Border(
             left=Side(style='thin'),
             right=Side(style='thin'),
             top=Side(style='thin'),
             bottom=Side(style='thin')
         )
-        center_alignment = Alignment(horizontal='center', vertical='center')
+        cell_style.alignment = Alignment(horizontal='center', vertical='center')
+        return cell_style, fill
+
+#Class for writing several tables to one excel file, every table is on its own sheet
+class WorkbookWriter(ExcelWriter):
+    def __init__(self, sheets, folder_path, filename="students", engine="pandas", update=False, file=None):
+        self.sheets = sheets
+        #Tables are in the sheets, so there is no table of the writer
+        super().__init__(None, 0, folder_path, filename, engine, update, file)
+
+    def _write(self, table, total_lines):
+        self._write_workbook(self.sheets)
+
+#Writers of the output files by format, format is selected on the main screen and in config.json
+OUTPUT_WRITERS = {"xlsx": ExcelWriter, "csv": CsvWriter, "parquet": ParquetWriter, "arrow": ArrowWriter}
+
+#Export which is waiting, running or finished in the export queue
+class ExportJob:
+    def __init__(self, name, key):
+        self.name = name
+        #Jobs with the same key (path of the file) are never run at the same time
+        self.key = key
+        #"queued", "running", "done" or "failed"
+        self.status = "queued"
+        self.path = None
+        self.error = None
+
+#Class for running exports in the background, so the window is not blocked while excel files are written
+class ExportQueue:
+    def __init__(self, workers=2):
+        self._executor = ThreadPoolExecutor(max_workers=workers)
+        self._locks = {}
+        self._locks_lock = threading.Lock()
+        self.jobs = []
+
+    #Add a job to the queue, function returns the path of the written file
+    def submit(self, name, key, function, *args):
+        job = ExportJob(name, key)
+        self.jobs.append(job)
+        self._executor.submit(self._run, job, function, args)
+        return job
+
+    def _run(self, job, function, args):
+        with self._locks_lock:
+            lock = self._locks.setdefault(job.key, threading.Lock())
+        with lock:
+            job.status = "running"
+            try:
+                job.path = function(*args)
+                job.status = "done"
+            except Exception as error:
+                job.error = repr(error)
+                job.status = "failed"
 
-        #Add border for the cell and fill the rows with a step with gray color
-        for row in sheet.iter_rows(min_row=2, max_row=sheet.max_row):
-            for cell in row:
-                cell.border = border
-                cell.alignment = center_alignment
-                if cell.row % 2 == 0:
-                    cell.fill = fill
 #Class for working with graphics
 class Gui(CTk.CTk): #TODO описать класс
     def __init__(self, app, *args, **kwargs):
@@ -331,6 +1402,7 @@ class Gui(CTk.CTk): #TODO описать класс
         self._BLUE_COLOR = "#1256D3"
         self._PURPLE_COLOR = "#5A4AEA"
         self._HOVER_PURPLE_COLOR = "#4533b5"
+        self._GRAY_COLOR = "#c9c9c9"
 
         # self._NEXT_BUTTON_TEXT = "Next"
         # self._BACK_BUTTON_TEXT = "Back"
@@ -343,6 +1415,8 @@ class Gui(CTk.CTk): #TODO описать класс
         # self._MENU_BUTTON_TEXT = "Paste"
         # self._MENU_ERR_WRONG_HTML_CODE_TEXT = "Wrong html code"
         # self._MENU_ERR_CANT_GET_CLIPBOARD_TEXT = "Cant get data from clipboard"
+        # self._MENU_CANCEL_BUTTON_TEXT = "Cancel"
+        # self._MENU_PASTE_MORE_TEXT = "Copy the next code, and click the button"
         
         # self._SETTINGS_TITLE_TEXT = "Settings"
         # self._SETTINGS_SELECT_FOLDER_TEXT = "Select a folder to save the files:"
@@ -355,12 +1429,18 @@ class Gui(CTk.CTk): #TODO описать класс
         # self._MAIN_WRITE_FILE_NAME_TEXT = "Write file name:"
         # self._MAIN_WRITE_LINES_COUNT_TEXT = "Write the numbe of lines:"
         # self._CUSTOM_ORDER_TEXT = "Custom order"
+        # self._COLLECT_WORKBOOK_TEXT = "Collect to workbook"
+        # self._MAIN_PASTE_MORE_BUTTON_TEXT = "Paste more"
+        # self._MAIN_OUTPUT_FORMAT_TEXT = "File format"
 
         # self._MAIN_MODAL_WINDOW_TITLE = "Write template name"
 
         # self._CUSTOM_ORDER_TITLE = "Custom order:"
 
         # self._SUCCESS_TITLE = "Success!"
+        # self._SUCCESS_WORKBOOK_SHEETS_TEXT = "Sheets in workbook: {}"
+        # self._SUCCESS_SAVE_WORKBOOK_TEXT = "Save workbook"
+        # self._JOB_STATUS_TEXTS = {"queued": "Queued", "running": "Running", "done": "Done", "failed": "Error"}
 
         self._NEXT_BUTTON_TEXT = "Seuraava"
         self._BACK_BUTTON_TEXT = "Takaisin"
@@ -373,6 +1453,8 @@ class Gui(CTk.CTk): #TODO описать класс
         self._MENU_PASTE_BUTTON_TEXT = "Liitä"
         self._MENU_ERR_WRONG_HTML_CODE_TEXT = "Virheellinen HTML-koodi"
         self._MENU_ERR_CANT_GET_CLIPBOARD_TEXT = "Ei voi saada tietoja leikepöydältä"
+        self._MENU_CANCEL_BUTTON_TEXT = "Peruuta"
+        self._MENU_PASTE_MORE_TEXT = "Kopioi seuraava koodi ja klikkaa"
 
         self._SETTINGS_TITLE_TEXT = "Asetukset"
         self._SETTINGS_SELECT_FOLDER_TEXT = "Valitse kansio tiedostojen tallentamista varten:"
@@ -385,12 +1467,18 @@ class Gui(CTk.CTk): #TODO описать класс
         self._MAIN_WRITE_FILE_NAME_TEXT = "Kirjoita tiedoston nimi:"
         self._MAIN_WRITE_LINES_COUNT_TEXT = "Kirjoita rivien määrä:"
         self._CUSTOM_ORDER_TEXT = "Mukautettu järjestys"
+        self._COLLECT_WORKBOOK_TEXT = "Kerää työkirjaan"
+        self._MAIN_PASTE_MORE_BUTTON_TEXT = "Liitä lisää"
+        self._MAIN_OUTPUT_FORMAT_TEXT = "Tiedostomuoto"
 
         self._MAIN_MODAL_WINDOW_TITLE = "Kirjoita mallin nimi"
 
         self._CUSTOM_ORDER_TITLE = "Mukautettu järjestys:"
 
         self._SUCCESS_TITLE = "Onnistui!"
+        self._SUCCESS_WORKBOOK_SHEETS_TEXT = "Taulukoita työkirjassa: {}"
+        self._SUCCESS_SAVE_WORKBOOK_TEXT = "Tallenna työkirja"
+        self._JOB_STATUS_TEXTS = {"queued": "Jonossa", "running": "Käynnissä", "done": "Valmis", "failed": "Virhe"}
 
         #Basic configuration of tkinter
         self.geometry("800x500")
@@ -398,84 +1486,125 @@ class Gui(CTk.CTk): #TODO описать класс
         self._set_appearance_mode("light")
         self.resizable(height=False, width=False)
 
-        #Load images
-        self._settings_image = CTk.CTkImage(light_image=Image.open(self._app.resource_path("settings.png")), dark_image=Image.open(self._app.resource_path("settings.png")), size=(50,50))
-        self._folder_image = CTk.CTkImage(light_image=Image.open(self._app.resource_path("folder.png")), dark_image=Image.open(self._app.resource_path("folder.png")), size=(20,20))
-        self._delete_image = CTk.CTkImage(light_image=Image.open(self._app.resource_path("close.png")), dark_image=Image.open(self._app.resource_path("close.png")), size=(15,15))
+        #Images are loaded when they are used for the first time
+        self._images = {}
+
+        #Screens are created once, when they are shown for the first time, after that they are only shown and hidden
+        self._screens = {}
+        self._current_screen = None
+        #Templates for which the buttons were created, the buttons are recreated only when the templates are changed
+        self._main_templates = None
+        self._settings_templates = None
+        #Id of the next update of the list of exports
+        self._jobs_after = None
+
+        self.grid_columnconfigure(0, weight=1)
+        self.grid_rowconfigure(1, weight=1)
+        self._load_header()
 
         #Load first window
         self.load_menu()
 
+    #Show screen by name, it is created by build function only the first time
+    def _show_screen(self, name, build):
+        #Parsing result is not needed when the menu is left
+        if self._current_screen == "menu" and name != "menu":
+            self._app.cancel_parse()
+        if name not in self._screens:
+            screen = CTk.CTkFrame(master=self, fg_color=self._WHITE_COLOR, bg_color=self._WHITE_COLOR, corner_radius=0)
+            screen.grid_columnconfigure(0, weight=1)
+            build(screen)
+            self._screens[name] = screen
+        for screen_name, screen in self._screens.items():
+            if screen_name != name:
+                screen.grid_remove()
+        self._screens[name].grid(row=1, column=0, sticky="nsew")
+        self._current_screen = name
+        #Settings can be opened only from the menu
+        self._set_header(is_show_settings=name == "menu")
+
     def load_menu(self):
-        self._clear()
-        self._load_header(is_show_settings=True)
-        menu_text = CTk.CTkLabel(master=self,fg_color=self._WHITE_COLOR,text_color="black",text=self._MENU_COPY_AND_CLICK_TEXT, font=(self._FONT,32))
-        menu_text.grid(row=1, column=0, pady=(90, 0))
+        self._show_screen("menu", self._build_menu)
+        self.error_text.configure(text="")
+        #When more html is pasted, it is joined with the previous one
+        self.menu_text.configure(text=self._MENU_PASTE_MORE_TEXT if self._app.merge_parsers else self._MENU_COPY_AND_CLICK_TEXT)
+
+    def _build_menu(self, screen):
+        self.menu_text = CTk.CTkLabel(master=screen,fg_color=self._WHITE_COLOR,text_color="black",text=self._MENU_COPY_AND_CLICK_TEXT, font=(self._FONT,32))
+        self.menu_text.grid(row=1, column=0, pady=(90, 0))
 
         #Label for errors
-        self.error_text = CTk.CTkLabel(master=self,fg_color=self._WHITE_COLOR,text_color="red",text="", font=(self._FONT,24))
+        self.error_text = CTk.CTkLabel(master=screen,fg_color=self._WHITE_COLOR,text_color="red",text="", font=(self._FONT,24))
         self.error_text.grid(row=2, column=0, pady=(5))
 
-        menu_button = CTk.CTkButton(master=self, command=self._app.menu_button_handle,hover_color=self._HOVER_PURPLE_COLOR,width=170,height=45, text_color="black",corner_radius=11,border_width=1,border_color="black",text=self._MENU_PASTE_BUTTON_TEXT,font=(self._FONT,30), fg_color=self._PURPLE_COLOR, bg_color=self._WHITE_COLOR)
-        menu_button.grid(row=3, column=0, pady=(10,0))
+        self.menu_button = CTk.CTkButton(master=screen, command=self._app.menu_button_handle,hover_color=self._HOVER_PURPLE_COLOR,width=170,height=45, text_color="black",corner_radius=11,border_width=1,border_color="black",text=self._MENU_PASTE_BUTTON_TEXT,font=(self._FONT,30), fg_color=self._PURPLE_COLOR, bg_color=self._WHITE_COLOR)
+        self.menu_button.grid(row=3, column=0, pady=(10,0))
+
+        #Progress of parsing and cancel button, they are shown only while parsing
+        self.parse_progress_frame = CTk.CTkFrame(master=screen, fg_color=self._WHITE_COLOR, bg_color=self._WHITE_COLOR)
+        self.parse_progress_bar = CTk.CTkProgressBar(master=self.parse_progress_frame, width=300, progress_color=self._PURPLE_COLOR)
+        self.parse_progress_bar.grid(row=0, column=0, padx=(0,10))
+        cancel_button = CTk.CTkButton(master=self.parse_progress_frame, command=self._app.cancel_parse,hover_color=self._HOVER_PURPLE_COLOR,width=80, text_color="black",border_width=1,border_color="black",text=self._MENU_CANCEL_BUTTON_TEXT,font=(self._FONT,18), fg_color=self._PURPLE_COLOR, bg_color=self._WHITE_COLOR)
+        cancel_button.grid(row=0, column=1)
+
+    #Show or hide progress of parsing on the menu
+    def show_parse_progress(self, is_show):
+        if is_show:
+            self.menu_button.configure(state="disabled")
+            #Until the tree is built the progress is unknown, so the bar just moves
+            self.parse_progress_bar.configure(mode="indeterminate")
+            self.parse_progress_bar.start()
+            self.parse_progress_frame.grid(row=4, column=0, pady=(20,0))
+        else:
+            self.parse_progress_bar.stop()
+            self.parse_progress_frame.grid_forget()
+            self.menu_button.configure(state="normal")
+
+    #Set progress of parsing from 0 to 1
+    def set_parse_progress(self, value):
+        if self.parse_progress_bar.cget("mode") == "indeterminate":
+            self.parse_progress_bar.stop()
+            self.parse_progress_bar.configure(mode="determinate")
+        self.parse_progress_bar.set(value)
 
     def load_main(self):
-        self._clear()
-        self._load_header()
-        self._app.filename = ""
+        self._show_screen("main", self._build_main)
+
+        #New html was pasted, so the fields and the inputs are reset
+        if self.field_list.model is not self._app.field_model:
+            self.field_list.set_model(self._app.field_model)
+            self.file_name_frame_entry.delete(0, CTk.END)
+            self.column_count_frame_entry.delete(0, CTk.END)
+            self.column_count_frame_entry.insert(0, 0)
+            self.is_custom_order.set(0)
 
-        BUTTON_PADDING = 5
-        BUTTON_FONT_SIZE = 18
+        if self._main_templates != list(self._app.config_manager.templates):
+            self._load_main_templates()
 
-        hero_text = CTk.CTkLabel(master=self, fg_color=self._WHITE_COLOR, text_color="black", text=self._MAIN_TITLE_TEXT, font=(self._FONT, 24))
+    def _build_main(self, screen):
+        hero_text = CTk.CTkLabel(master=screen, fg_color=self._WHITE_COLOR, text_color="black", text=self._MAIN_TITLE_TEXT, font=(self._FONT, 24))
         hero_text.grid(row=1,column=0, sticky="w", padx=(7,0), pady=(7,0))
 
-        template_buttons_frame = CTk.CTkFrame(master=self, fg_color=self._WHITE_COLOR, bg_color=self._WHITE_COLOR)
-        template_buttons_frame.grid(row=2, column=0, sticky="w")
+        self._template_buttons_frame = CTk.CTkFrame(master=screen, fg_color=self._WHITE_COLOR, bg_color=self._WHITE_COLOR)
+        self._template_buttons_frame.grid(row=2, column=0, sticky="w")
 
         #Clear all selected fields
-        template_clear = CTk.CTkButton(master=template_buttons_frame,command=lambda: self._app.select_all_checkboxes(0),hover_color=self._HOVER_PURPLE_COLOR,width=80,height=20, text_color="black",corner_radius=11,border_width=1,border_color="black",text=self._MAIN_CLEAR_BUTTON_TEXT,font=(self._FONT,BUTTON_FONT_SIZE), fg_color=self._PURPLE_COLOR, bg_color=self._WHITE_COLOR)
-        template_clear.grid(row=0, column=0, sticky="w", padx=(BUTTON_PADDING,0),pady=(BUTTON_PADDING, 0))
+        template_clear = self._create_template_button(self._MAIN_CLEAR_BUTTON_TEXT, lambda: self._app.select_all_checkboxes(0))
+        template_clear.grid(row=0, column=0, sticky="w", padx=(5,0),pady=(5, 0))
 
         #Select all fields
-        template_all = CTk.CTkButton(master=template_buttons_frame, command=lambda: self._app.select_all_checkboxes(1),hover_color=self._HOVER_PURPLE_COLOR,width=80,height=20, text_color="black",corner_radius=11,border_width=1,border_color="black",text=self._MAIN_ALL_BUTTON_TEXT,font=(self._FONT,BUTTON_FONT_SIZE), fg_color=self._PURPLE_COLOR, bg_color=self._WHITE_COLOR)
-        template_all.grid(row=0, column=1,sticky="w", padx=(BUTTON_PADDING,0),pady=(BUTTON_PADDING, 0))
+        template_all = self._create_template_button(self._MAIN_ALL_BUTTON_TEXT, lambda: self._app.select_all_checkboxes(1))
+        template_all.grid(row=0, column=1,sticky="w", padx=(5,0),pady=(5, 0))
 
-        #Insert templates
-        for n,i in enumerate(self._app.config_manager.templates):
-            button = CTk.CTkButton(master=template_buttons_frame,command=lambda name=i: self._app.select_checkboxes_by_template(name),hover_color=self._HOVER_PURPLE_COLOR,width=80,height=20, text_color="black",corner_radius=11,border_width=1,border_color="black",text=i,font=(self._FONT,BUTTON_FONT_SIZE), fg_color=self._PURPLE_COLOR, bg_color=self._WHITE_COLOR)
-            button.grid(row=0, column=2+n,sticky="w", padx=(BUTTON_PADDING,0),pady=(BUTTON_PADDING, 0))
+        #Buttons of the templates, they are created in _load_main_templates
+        self._template_buttons = []
 
-        #Insert add template button, can be maximum 3 templates
-        if len(self._app.config_manager.templates) < 3:
-            template_add = CTk.CTkButton(master=template_buttons_frame,command=self.load_add_tamplate_modal_window,hover_color=self._HOVER_PURPLE_COLOR,width=30,height=20, text_color="black",corner_radius=11,border_width=1,border_color="black",text="+",font=(self._FONT,BUTTON_FONT_SIZE), fg_color=self._PURPLE_COLOR, bg_color=self._WHITE_COLOR)
-            template_add.grid(row=0, column=2+len(self._app.config_manager.templates),sticky="w",padx=(BUTTON_PADDING,0),pady=(BUTTON_PADDING,0))
-
-        checkbox_frame = CTk.CTkScrollableFrame(master=self,fg_color="#D5D5D5",bg_color=self._WHITE_COLOR, width=380, height=300)
-        checkbox_frame.grid(row=3, column=0, sticky="w", padx=(10,0), pady=(10,0))
-
-        self.checkboxes_list = []
-        self.entry_list = []
-
-        #Insert fields checkboxes from html
-        for n,i in enumerate(self._app.html_parser.fields_list):
-            if n == 0:
-                continue
+        #Fields from html, state of the selection is kept in the model
+        self.field_list = VirtualFieldList(screen, self._app.field_model, font=self._FONT, active_color=self._WHITE_COLOR, fg_color="#D5D5D5",bg_color=self._WHITE_COLOR, width=400, height=310)
+        self.field_list.grid_propagate(False)
+        self.field_list.grid(row=3, column=0, sticky="w", padx=(10,0), pady=(10,0))
 
-            state = "disabled"
-
-            checkbox_var = CTk.IntVar(value=0)
-            checkbox_var.trace_add("write", lambda var_name, index, mode, value=n: self._app.on_select_checkbox(var_name, index, mode, value))
-            checkbox = CTk.CTkCheckBox(master=checkbox_frame,variable=checkbox_var, text=i, font=(self._FONT,14), text_color="black", checkbox_width=20, checkbox_height=20)
-            checkbox.grid(row=n*2, column=0, sticky="w")
-            self.checkboxes_list.append(checkbox)
-
-            entry = CTk.CTkEntry(master=checkbox_frame, state=state,font=(self._FONT, 16),width=200, fg_color="#D5D5D5",text_color="black")
-            entry.grid(row=n*2+1, column=0, sticky="w",pady=(0,10), padx=(25,0))
-            entry.bind("<Return>", self._app.focus_next_entry)
-            self.entry_list.append(entry)
-
-        additions_frame = CTk.CTkFrame(master=self,bg_color=self._WHITE_COLOR, fg_color=self._WHITE_COLOR)
+        additions_frame = CTk.CTkFrame(master=screen,bg_color=self._WHITE_COLOR, fg_color=self._WHITE_COLOR)
         additions_frame.grid(row=3, column=0, sticky="ne", padx=(0,40))
 
         file_name_frame_text = CTk.CTkLabel(master=additions_frame, text=self._MAIN_WRITE_FILE_NAME_TEXT, font=(self._FONT, 24),text_color="black")
@@ -497,21 +1626,80 @@ class Gui(CTk.CTk): #TODO описать класс
         checkbox_is_custom_order = CTk.CTkCheckBox(master=additions_frame,bg_color=self._WHITE_COLOR,variable=self.is_custom_order, text=self._CUSTOM_ORDER_TEXT, font=(self._FONT,22), text_color="black", checkbox_width=20, checkbox_height=20)
         checkbox_is_custom_order.grid(row=4, column=0, pady=(30,0))
 
-        back_button = CTk.CTkButton(master=self,command=lambda: self._app.change_window(0),hover_color=self._HOVER_PURPLE_COLOR, text=self._BACK_BUTTON_TEXT, fg_color=self._PURPLE_COLOR, font=(self._FONT, 18), bg_color=self._WHITE_COLOR, width=70, border_width=1, border_color="black", text_color="black")
+        #If selected, the table is added as a sheet to one workbook instead of writing a separate file
+        self.is_collect_workbook = CTk.IntVar(value=self._app.collect_workbook)
+        checkbox_is_collect_workbook = CTk.CTkCheckBox(master=additions_frame,bg_color=self._WHITE_COLOR,variable=self.is_collect_workbook, text=self._COLLECT_WORKBOOK_TEXT, font=(self._FONT,22), text_color="black", checkbox_width=20, checkbox_height=20)
+        checkbox_is_collect_workbook.grid(row=5, column=0, pady=(10,0))
+
+        output_format_text = CTk.CTkLabel(master=additions_frame, text=self._MAIN_OUTPUT_FORMAT_TEXT, font=(self._FONT, 24),text_color="black")
+        output_format_text.grid(row=6,column=0, pady=(20,0))
+
+        #Format of the file, the workbook is always written to excel
+        self.output_format = CTk.StringVar(value=self._app.config_manager.output_format)
+        output_format_button = CTk.CTkSegmentedButton(master=additions_frame, values=list(OUTPUT_WRITERS), variable=self.output_format, command=self._app.set_output_format, font=(self._FONT,18), selected_color=self._PURPLE_COLOR, selected_hover_color=self._HOVER_PURPLE_COLOR, text_color="black")
+        output_format_button.grid(row=7, column=0, pady=(10,0))
+
+        back_button = CTk.CTkButton(master=screen,command=self._app.leave_main,hover_color=self._HOVER_PURPLE_COLOR, text=self._BACK_BUTTON_TEXT, fg_color=self._PURPLE_COLOR, font=(self._FONT, 18), bg_color=self._WHITE_COLOR, width=70, border_width=1, border_color="black", text_color="black")
         back_button.grid(row=4, column=0, sticky="ws", padx=(10,0), pady=(5,0))
 
-        next_button = CTk.CTkButton(master=self,command=self._app.compilate_data,hover_color=self._HOVER_PURPLE_COLOR, text=self._NEXT_BUTTON_TEXT, fg_color=self._PURPLE_COLOR, font=(self._FONT, 18), bg_color=self._WHITE_COLOR, width=70, border_width=1, border_color="black", text_color="black")
+        #Paste one more export, it is joined with this one by the names of the students
+        paste_more_button = CTk.CTkButton(master=screen,command=self._app.paste_more,hover_color=self._HOVER_PURPLE_COLOR, text=self._MAIN_PASTE_MORE_BUTTON_TEXT, fg_color=self._PURPLE_COLOR, font=(self._FONT, 18), bg_color=self._WHITE_COLOR, border_width=1, border_color="black", text_color="black")
+        paste_more_button.grid(row=4, column=0, sticky="s", pady=(5,0))
+
+        next_button = CTk.CTkButton(master=screen,command=self._app.compilate_data,hover_color=self._HOVER_PURPLE_COLOR, text=self._NEXT_BUTTON_TEXT, fg_color=self._PURPLE_COLOR, font=(self._FONT, 18), bg_color=self._WHITE_COLOR, width=70, border_width=1, border_color="black", text_color="black")
         next_button.grid(row=4, column=0, sticky="se", padx=(0,10), pady=(5,0))
 
+    #Recreate buttons of the templates on the main screen
+    def _load_main_templates(self):
+        for button in self._template_buttons:
+            button.destroy()
+        self._template_buttons = []
+        templates = list(self._app.config_manager.templates)
+
+        #Insert templates
+        for n,i in enumerate(templates):
+            button = self._create_template_button(i, lambda name=i: self._app.select_checkboxes_by_template(name))
+            button.grid(row=0, column=2+n,sticky="w", padx=(5,0),pady=(5, 0))
+            self._template_buttons.append(button)
+
+        #Insert add template button, can be maximum 3 templates
+        if len(templates) < 3:
+            template_add = self._create_template_button("+", self.load_add_tamplate_modal_window, width=30)
+            template_add.grid(row=0, column=2+len(templates),sticky="w",padx=(5,0),pady=(5,0))
+            self._template_buttons.append(template_add)
+        self._main_templates = templates
+
+    def _create_template_button(self, text, command, width=80):
+        return CTk.CTkButton(master=self._template_buttons_frame,command=command,hover_color=self._HOVER_PURPLE_COLOR,width=width,height=20, text_color="black",corner_radius=11,border_width=1,border_color="black",text=text,font=(self._FONT,18), fg_color=self._PURPLE_COLOR, bg_color=self._WHITE_COLOR)
+
     def load_success(self):
-        self._clear()
-        self._load_header()
+        self._show_screen("success", self._build_success)
+
+        #If there are collected sheets, show how many and the button to save them to one file
+        if len(self._app.workbook_sheets) != 0:
+            self._workbook_text.configure(text=self._SUCCESS_WORKBOOK_SHEETS_TEXT.format(len(self._app.workbook_sheets)))
+            self._workbook_frame.grid()
+            self._author_text.grid_configure(pady=(5,0))
+        else:
+            self._workbook_frame.grid_remove()
+            self._author_text.grid_configure(pady=(30,0))
+
+        #Start updating the list of exports, if it is not running already
+        if self._jobs_after is None:
+            self._refresh_jobs()
 
-        success_text = CTk.CTkLabel(master=self, text=self._SUCCESS_TITLE, font=(self._FONT,32),fg_color=self._WHITE_COLOR,text_color="black")
-        success_text.grid(row=1, column=0, pady=(100, 0))
+    def _build_success(self, screen):
+        success_text = CTk.CTkLabel(master=screen, text=self._SUCCESS_TITLE, font=(self._FONT,32),fg_color=self._WHITE_COLOR,text_color="black")
+        success_text.grid(row=1, column=0, pady=(20, 0))
 
-        success_frame = CTk.CTkFrame(master=self, bg_color=self._WHITE_COLOR, fg_color=self._WHITE_COLOR)
-        success_frame.grid(row=2,column=0, pady=(15,0))
+        #List of exports, the last ones are first
+        self.jobs_frame = CTk.CTkScrollableFrame(master=screen, fg_color="#D5D5D5", bg_color=self._WHITE_COLOR, width=700, height=150)
+        self.jobs_frame.grid(row=2, column=0, pady=(10,0))
+        self.jobs_frame.grid_columnconfigure(0, weight=1)
+        self._job_labels = []
+
+        success_frame = CTk.CTkFrame(master=screen, bg_color=self._WHITE_COLOR, fg_color=self._WHITE_COLOR)
+        success_frame.grid(row=3,column=0, pady=(15,0))
 
         exit_button = CTk.CTkButton(master=success_frame,command=self.quit,bg_color=self._WHITE_COLOR,width=100, text=self._EXIT_BUTTON_TEXT, font=(self._FONT,24), fg_color=self._PURPLE_COLOR,hover_color=self._HOVER_PURPLE_COLOR, border_width=1, border_color="black",text_color="black")
         exit_button.grid(row=0,column=0)
@@ -522,88 +1710,129 @@ class Gui(CTk.CTk): #TODO описать класс
         exit_button = CTk.CTkButton(master=success_frame,command=lambda:self._app.change_window(0),bg_color=self._WHITE_COLOR,width=100, text=self._MENU_BUTTON_TEXT, font=(self._FONT,24), fg_color=self._PURPLE_COLOR,hover_color=self._HOVER_PURPLE_COLOR, border_width=1, border_color="black",text_color="black")
         exit_button.grid(row=0,column=2)
 
-        author_text = CTk.CTkLabel(master=self,font=(self._FONT, 16),text_color="black",bg_color=self._WHITE_COLOR, fg_color=self._WHITE_COLOR, text="Author: Huziichuk Nazar | Github: guziiuchyk/Teacher-helper | Gmail: guziiuchyk@gmail.com")
-        author_text.grid(row=3, column=0, sticky="s",pady=(210,0))
+        #Collected sheets and the button to save them, shown only when there are sheets
+        self._workbook_frame = CTk.CTkFrame(master=screen, bg_color=self._WHITE_COLOR, fg_color=self._WHITE_COLOR)
+        self._workbook_frame.grid(row=4, column=0, pady=(15,0))
+
+        self._workbook_text = CTk.CTkLabel(master=self._workbook_frame, text="", font=(self._FONT,20),fg_color=self._WHITE_COLOR,text_color="black")
+        self._workbook_text.grid(row=0, column=0, padx=(0,10))
+
+        save_workbook_button = CTk.CTkButton(master=self._workbook_frame,command=self._app.save_workbook,bg_color=self._WHITE_COLOR, text=self._SUCCESS_SAVE_WORKBOOK_TEXT, font=(self._FONT,20), fg_color=self._PURPLE_COLOR,hover_color=self._HOVER_PURPLE_COLOR, border_width=1, border_color="black",text_color="black")
+        save_workbook_button.grid(row=0, column=1)
+
+        self._author_text = CTk.CTkLabel(master=screen,font=(self._FONT, 16),text_color="black",bg_color=self._WHITE_COLOR, fg_color=self._WHITE_COLOR, text="Author: Huziichuk Nazar | Github: guziiuchyk/Teacher-helper | Gmail: guziiuchyk@gmail.com")
+        self._author_text.grid(row=5, column=0, sticky="s",pady=(30,0))
+
+    #Update the list of exports, it repeats while the success window is shown
+    def _refresh_jobs(self):
+        if self._current_screen != "success":
+            self._jobs_after = None
+            return
+        jobs = list(reversed(self._app.export_queue.jobs))
+        #Add labels for the new jobs
+        while len(self._job_labels) < len(jobs):
+            label = CTk.CTkLabel(master=self.jobs_frame, text="", font=(self._FONT,14), text_color="black", anchor="w")
+            label.grid(row=len(self._job_labels), column=0, sticky="we", padx=5)
+            self._job_labels.append(label)
+        for label, job in zip(self._job_labels, jobs):
+            text = f"{self._JOB_STATUS_TEXTS[job.status]}: {job.name}"
+            if job.path:
+                text += f" -> {os.path.abspath(job.path)}"
+            if job.error:
+                text += f" ({job.error})"
+            if label.cget("text") != text:
+                label.configure(text=text, text_color="red" if job.status == "failed" else "black")
+        self._jobs_after = self.after(300, self._refresh_jobs)
 
     def load_custom_order(self):
-        self._clear()
-        self._load_header()
+        self._show_screen("custom_order", self._build_custom_order)
+        self.draggable_listbox.set_items(self._app.get_select_fields_for_drag())
 
-        custom_order_text = CTk.CTkLabel(master=self, text=self._CUSTOM_ORDER_TITLE, font=(self._FONT,30),fg_color=self._WHITE_COLOR,text_color="black")
+    def _build_custom_order(self, screen):
+        custom_order_text = CTk.CTkLabel(master=screen, text=self._CUSTOM_ORDER_TITLE, font=(self._FONT,30),fg_color=self._WHITE_COLOR,text_color="black")
         custom_order_text.grid(row=1, column=0, pady=(10,0))
 
-        self.draggable_listbox = DraggableListbox(self, self._app.get_select_fields_for_drag())
+        self.draggable_listbox = DraggableListbox(screen, [])
         self.draggable_listbox.grid(row=2, column=0,pady=10)
 
-        next_button = CTk.CTkButton(master=self,command=lambda: self._app.change_window(1),hover_color=self._HOVER_PURPLE_COLOR, text=self._BACK_BUTTON_TEXT, fg_color=self._PURPLE_COLOR, font=(self._FONT, 18), bg_color=self._WHITE_COLOR, width=70, border_width=1, border_color="black", text_color="black")
+        next_button = CTk.CTkButton(master=screen,command=lambda: self._app.change_window(1),hover_color=self._HOVER_PURPLE_COLOR, text=self._BACK_BUTTON_TEXT, fg_color=self._PURPLE_COLOR, font=(self._FONT, 18), bg_color=self._WHITE_COLOR, width=70, border_width=1, border_color="black", text_color="black")
         next_button.grid(row=3, column=0, sticky="sw", padx=(10,0), pady=(125,0))
 
-        back_button = CTk.CTkButton(master=self,command=lambda: self._app.compilate_ordered_data(self.draggable_listbox.get_items()),hover_color=self._HOVER_PURPLE_COLOR, text=self._NEXT_BUTTON_TEXT, fg_color=self._PURPLE_COLOR, font=(self._FONT, 18), bg_color=self._WHITE_COLOR, width=70, border_width=1, border_color="black", text_color="black")
+        back_button = CTk.CTkButton(master=screen,command=lambda: self._app.compilate_ordered_data(self.draggable_listbox.get_items()),hover_color=self._HOVER_PURPLE_COLOR, text=self._NEXT_BUTTON_TEXT, fg_color=self._PURPLE_COLOR, font=(self._FONT, 18), bg_color=self._WHITE_COLOR, width=70, border_width=1, border_color="black", text_color="black")
         back_button.grid(row=3, column=0, sticky="se", padx=(0,10), pady=(125,0))
 
     def load_settings(self):
-        self._clear()
-        self._load_header()
+        self._show_screen("settings", self._build_settings)
+
+        self.selected_folder_entry.configure(state="normal")
+        self.selected_folder_entry.delete(0, CTk.END)
+        if self._app.config_manager.save_folder_path:
+            self.selected_folder_entry.insert(0, self._app.config_manager.save_folder_path)
+        else:
+            self.selected_folder_entry.insert(0, Path.cwd())
+        self.selected_folder_entry.configure(state="disabled")
 
-        GRAY_COLOR = "#c9c9c9"
+        if self._settings_templates != list(self._app.config_manager.templates):
+            self._load_settings_templates()
 
-        frame = CTk.CTkFrame(master=self, corner_radius=28, fg_color=GRAY_COLOR, width=400, height=350, bg_color=self._WHITE_COLOR)
+    def _build_settings(self, screen):
+        frame = CTk.CTkFrame(master=screen, corner_radius=28, fg_color=self._GRAY_COLOR, width=400, height=350, bg_color=self._WHITE_COLOR)
         frame.grid(row=1, column=0, pady=(10,0))
         frame.grid_columnconfigure(0, weight=1)
         frame.grid_propagate(False)
 
-        settings_text = CTk.CTkLabel(master=frame, text=self._SETTINGS_TITLE_TEXT, font=(self._FONT,30),fg_color=GRAY_COLOR,text_color="black")
+        settings_text = CTk.CTkLabel(master=frame, text=self._SETTINGS_TITLE_TEXT, font=(self._FONT,30),fg_color=self._GRAY_COLOR,text_color="black")
         settings_text.grid(row=0, column=0, pady=(10,0))
 
-        choose_directory_text = CTk.CTkLabel(master=frame, text=self._SETTINGS_SELECT_FOLDER_TEXT, font=(self._FONT,18),fg_color="#c9c9c9",text_color="black")
+        choose_directory_text = CTk.CTkLabel(master=frame, text=self._SETTINGS_SELECT_FOLDER_TEXT, font=(self._FONT,18),fg_color=self._GRAY_COLOR,text_color="black")
         choose_directory_text.grid(row=1, column=0, pady=(10,0))
 
-        select_folder_frame = CTk.CTkFrame(master=frame, fg_color=GRAY_COLOR)
+        select_folder_frame = CTk.CTkFrame(master=frame, fg_color=self._GRAY_COLOR)
         select_folder_frame.grid(row=2, column=0, pady=(5,0))
 
         self.selected_folder_entry = CTk.CTkEntry(master=select_folder_frame, text_color="black",fg_color=self._WHITE_COLOR, corner_radius=5, font=(self._FONT,10),width=250)
-        
-        if self._app.config_manager.save_folder_path:
-            self.selected_folder_entry.insert(0, self._app.config_manager.save_folder_path)
-        else:
-            self.selected_folder_entry.insert(0, Path.cwd())
-
-        self.selected_folder_entry.configure(state="disabled")
         self.selected_folder_entry.grid(row=0,column=0)
 
-        select_folder_button = CTk.CTkButton(master=select_folder_frame, command=self._app.on_click_select_folder, image=self._folder_image, text="", width=20, border_width=1, border_color="black")
+        select_folder_button = CTk.CTkButton(master=select_folder_frame, command=self._app.on_click_select_folder, image=self._get_image("folder.png", 20), text="", width=20, border_width=1, border_color="black")
         select_folder_button.grid(row=0, column=1, padx=(3,0))
 
-        clear_folder_button = CTk.CTkButton(master=select_folder_frame, command=self._app.on_click_remove_folder, image=self._delete_image, text="", width=20, border_width=1, border_color="black")
+        clear_folder_button = CTk.CTkButton(master=select_folder_frame, command=self._app.on_click_remove_folder, image=self._get_image("close.png", 15), text="", width=20, border_width=1, border_color="black")
         clear_folder_button.grid(row=0, column=2, padx=(3,0))
 
-        delete_templates_text = CTk.CTkLabel(master=frame, text=self._SETTINGS_DELETE_TEMPLATES_TEXT, font=(self._FONT,24),fg_color="#c9c9c9",text_color="black")
+        delete_templates_text = CTk.CTkLabel(master=frame, text=self._SETTINGS_DELETE_TEMPLATES_TEXT, font=(self._FONT,24),fg_color=self._GRAY_COLOR,text_color="black")
         delete_templates_text.grid(row=3, column=0, pady=(30,0))
 
-        if len(self._app.config_manager.templates) != 0:
-            templates_frame = CTk.CTkFrame(master=frame, fg_color=GRAY_COLOR)
-            templates_frame.grid(row=4,column=0)
-
-            for n,i in enumerate(self._app.config_manager.templates):
-                delete_template_button = CTk.CTkButton(master=templates_frame,command=lambda name=i:(self._app.on_click_delete_template(name), delete_template_button.destroy()),hover_color=self._HOVER_PURPLE_COLOR,width=80,height=20, text_color="black",corner_radius=11,border_width=1,border_color="black",text=i,font=(self._FONT,18), fg_color=self._PURPLE_COLOR, bg_color=GRAY_COLOR)
-                delete_template_button.grid(row=0, column=n, padx=5)
-        else:
-            not_found_text = CTk.CTkLabel(master=frame, text="Not found", font=(self._FONT,20),fg_color="#c9c9c9",text_color="black")
-            not_found_text.grid(row=4,column=0, pady=(10,0))
+        #Buttons for deleting of the templates, they are created in _load_settings_templates
+        self._settings_templates_frame = CTk.CTkFrame(master=frame, fg_color=self._GRAY_COLOR)
+        self._settings_templates_frame.grid(row=4,column=0, pady=(10,0))
 
-        back_button = CTk.CTkButton(master=self,command=lambda:self._app.change_window(0),bg_color=self._WHITE_COLOR,width=100, text=self._BACK_BUTTON_TEXT, font=(self._FONT,24), fg_color=self._PURPLE_COLOR,hover_color=self._HOVER_PURPLE_COLOR, border_width=1, border_color="black",text_color="black")
+        back_button = CTk.CTkButton(master=screen,command=lambda:self._app.change_window(0),bg_color=self._WHITE_COLOR,width=100, text=self._BACK_BUTTON_TEXT, font=(self._FONT,24), fg_color=self._PURPLE_COLOR,hover_color=self._HOVER_PURPLE_COLOR, border_width=1, border_color="black",text_color="black")
         back_button.grid(row=2, column=0, padx=(0,110), pady=(10,0))
 
-        save_button = CTk.CTkButton(master=self,command=self._app.on_click_save_settings,bg_color=self._WHITE_COLOR,width=100, text=self._SAVE_BUTTON_TEXT, font=(self._FONT,24), fg_color=self._PURPLE_COLOR,hover_color=self._HOVER_PURPLE_COLOR, border_width=1, border_color="black",text_color="black")
+        save_button = CTk.CTkButton(master=screen,command=self._app.on_click_save_settings,bg_color=self._WHITE_COLOR,width=100, text=self._SAVE_BUTTON_TEXT, font=(self._FONT,24), fg_color=self._PURPLE_COLOR,hover_color=self._HOVER_PURPLE_COLOR, border_width=1, border_color="black",text_color="black")
         save_button.grid(row=2, column=0, padx=(110,0), pady=(10,0))
 
+    #Recreate buttons for deleting of the templates on the settings screen
+    def _load_settings_templates(self):
+        for e in self._settings_templates_frame.winfo_children():
+            e.destroy()
+        templates = list(self._app.config_manager.templates)
+
+        if len(templates) != 0:
+            for n,i in enumerate(templates):
+                delete_template_button = CTk.CTkButton(master=self._settings_templates_frame,command=lambda name=i:(self._app.on_click_delete_template(name), self._load_settings_templates()),hover_color=self._HOVER_PURPLE_COLOR,width=80,height=20, text_color="black",corner_radius=11,border_width=1,border_color="black",text=i,font=(self._FONT,18), fg_color=self._PURPLE_COLOR, bg_color=self._GRAY_COLOR)
+                delete_template_button.grid(row=0, column=n, padx=5)
+        else:
+            not_found_text = CTk.CTkLabel(master=self._settings_templates_frame, text=self._SETTINGS_NOT_FOUND_TEXT, font=(self._FONT,20),fg_color=self._GRAY_COLOR,text_color="black")
+            not_found_text.grid(row=0,column=0)
+        self._settings_templates = templates
+
     def load_add_tamplate_modal_window(self):
-        background_frame = CTk.CTkFrame(master=self, width=800, height=427, fg_color=self._WHITE_COLOR,bg_color=self._WHITE_COLOR)
-        background_frame.grid_propagate(False)
-        background_frame.grid_columnconfigure(0, weight=1)
-        background_frame.grid(row=1, column=0)
+        self._show_screen("add_template", self._build_add_template_modal_window)
+        self._template_name_entry.delete(0, CTk.END)
 
-        frame = CTk.CTkFrame(master=background_frame, width=300, height=180, corner_radius=20, border_color="black", border_width=1, fg_color="#dedede")
+    def _build_add_template_modal_window(self, screen):
+        frame = CTk.CTkFrame(master=screen, width=300, height=180, corner_radius=20, border_color="black", border_width=1, fg_color="#dedede")
         frame.grid_propagate(False)
         frame.grid_columnconfigure(0, weight=1)
         frame.grid(row=0, column=0, pady=(100,10))
@@ -611,28 +1840,37 @@ class Gui(CTk.CTk): #TODO описать класс
         title = CTk.CTkLabel(master=frame, fg_color="#dedede", text_color="black", text=self._MAIN_MODAL_WINDOW_TITLE, font=(self._FONT, 24))
         title.grid(row=0, column=0, pady=(30,10))
 
-        entry = CTk.CTkEntry(master=frame,width=180, text_color="black",fg_color=self._WHITE_COLOR, font=(self._FONT,20))
-        entry.grid(row=1,column=0, pady=(0,10))
+        self._template_name_entry = CTk.CTkEntry(master=frame,width=180, text_color="black",fg_color=self._WHITE_COLOR, font=(self._FONT,20))
+        self._template_name_entry.grid(row=1,column=0, pady=(0,10))
 
         back_button = CTk.CTkButton(master=frame,command=lambda:self._app.change_window(1),bg_color=self._WHITE_COLOR,width=90, text=self._BACK_BUTTON_TEXT, font=(self._FONT,22), fg_color=self._PURPLE_COLOR,hover_color=self._HOVER_PURPLE_COLOR, border_width=1, border_color="black",text_color="black")
         back_button.grid(row=2, column=0,padx=(0,100))
-        save_button = CTk.CTkButton(master=frame,command=lambda:(self._app.save_tamplate(entry.get()),self._app.change_window(1)),bg_color=self._WHITE_COLOR,width=90, text=self._SAVE_BUTTON_TEXT, font=(self._FONT,22), fg_color=self._PURPLE_COLOR,hover_color=self._HOVER_PURPLE_COLOR, border_width=1, border_color="black",text_color="black")
+        save_button = CTk.CTkButton(master=frame,command=lambda:(self._app.save_tamplate(self._template_name_entry.get()),self._app.change_window(1)),bg_color=self._WHITE_COLOR,width=90, text=self._SAVE_BUTTON_TEXT, font=(self._FONT,22), fg_color=self._PURPLE_COLOR,hover_color=self._HOVER_PURPLE_COLOR, border_width=1, border_color="black",text_color="black")
         save_button.grid(row=2, column=0,padx=(100,0))
 
-    #Clear window
-    def _clear(self):
-        for e in self.winfo_children():
-            e.destroy()
-    
-    def _load_header(self, is_show_settings=False):
+    #Return image by file name, it is loaded only once
+    def _get_image(self, name, size):
+        if name not in self._images:
+            from PIL import Image
+            image = Image.open(self._app.resource_path(name))
+            self._images[name] = CTk.CTkImage(light_image=image, dark_image=image, size=(size,size))
+        return self._images[name]
+
+    #Header is created once, the settings button is shown only on the menu
+    def _load_header(self):
         header_frame = CTk.CTkFrame(master=self,border_width=0, fg_color=self._BLUE_COLOR, width=800, height=73, corner_radius=0)
         header_frame__text = CTk.CTkLabel(master=self, text=self._HEADER_TEXT, bg_color=self._BLUE_COLOR,font=(self._FONT,40))
         header_frame__text.grid(row=0, column=0)
-        if(is_show_settings == True):
-            header_settings = CTk.CTkButton(master=self, command=self.load_settings,image=self._settings_image, hover_color=self._BLUE_COLOR, fg_color=self._BLUE_COLOR,bg_color=self._BLUE_COLOR, text="", width=50)
-            header_settings.grid(row=0,column=0, sticky="e",padx=20)
+        self._header_settings = CTk.CTkButton(master=self, command=self.load_settings,image=self._get_image("settings.png", 50), hover_color=self._BLUE_COLOR, fg_color=self._BLUE_COLOR,bg_color=self._BLUE_COLOR, text="", width=50)
+        self._header_settings.grid(row=0,column=0, sticky="e",padx=20)
         header_frame.grid(row=0, column=0)
 
+    def _set_header(self, is_show_settings=False):
+        if is_show_settings:
+            self._header_settings.grid()
+        else:
+            self._header_settings.grid_remove()
+
 #Class that combines all classes and connects ui with logic
 class App:
     def __init__(self):
@@ -640,10 +1878,25 @@ class App:
         self.config_manager = None
         self.selected_fields = None
         self.html_parser = None
-        self.filename = ""
+        self._data_manager = None
+        #Parsed exports (parser, run) which are joined with the next pasted one
+        self.merge_parsers = []
+        self._exports = []
+        self.field_model = None
+        #Sheets (name, table, total lines) collected for one workbook
+        self.workbook_sheets = []
+        self.collect_workbook = 0
+        #Event for cancelling of running parsing
+        self._parse_cancel = None
+        self._file_manager = None
+        #Plans of the selected fields, they are reused while the same export or template is used
+        self._field_plans = FieldPlanCache()
         self.gui = Gui(self)
         self._read_config()
         self.gui.mainloop()
+        #Config changes which are still waiting are written before exit
+        if self._file_manager:
+            self._file_manager.flush()
 
     #Read config and save it on config manager
     def _read_config(self):
@@ -652,6 +1905,14 @@ class App:
             self._file_manager = FileManager()
             #Save config on config manager
             self.config_manager = ConfigManager(self._file_manager.config)
+            #Cache of parsed html, so the same export is not parsed again
+            self._parse_cache = None
+            if self.config_manager.parse_cache_mb > 0:
+                self._parse_cache = ParseCache(self._file_manager.cache_folder, self.config_manager.parse_cache_mb * 1024 * 1024)
+            #Queue for writing excel files in the background
+            self.export_queue = ExportQueue(self.config_manager.export_workers)
+            #Journal with the time of every stage of the runs
+            self.journal = RunJournal(self._file_manager.logs_folder, self.config_manager.run_journal_kb * 1024, is_profile=self.config_manager.profile)
         #Error when config file not found
         except FileNotFoundError:
             self.gui.error_text.configure(text="Config file not found")
@@ -659,20 +1920,92 @@ class App:
         except json.JSONDecodeError:
             self.gui.error_text.configure(text="Cant read config file")
 
-    #Parse html
-    def _parse_html(self):
-        self.html_parser = HtmlParcer(self._html)
-    #Write table to excel file
-    def _write_to_excel(self):
-        
-        #We check if it is possible to take data from the input for the file name, 
-        #because if you use a custom order, then the input is not rendered and there will be an error, 
-        #and if an error occurs, then write the last state of the input
-
+    #Parse html, it runs on a separate thread, results are sent to the queue and read by _poll_parse on the main thread
+    def _parse_html(self, html, results, cancel, timer):
+        #Information about the run, it is added to the journal when the table is exported
+        run = {"input_bytes": len(html.encode("utf-8", "surrogatepass")), "stages": timer.stages}
         try:
-            total_lines = self.gui.column_count_frame_entry.get()
-        except:
-            total_lines = self.total_lines
+            with timer.stage("parse"):
+                normalizer = CellNormalizer(self.config_manager.mark_map, self.config_manager.cast_numbers)
+                html_parser = self.journal.run("parse", HtmlParcer, html, self.config_manager.html_parser, self._parse_cache, lambda value: results.put(("progress", value)), cancel, normalizer)
+            results.put(("done", (html_parser, run)))
+        except ParseCancelled:
+            pass
+        except Exception as error:
+            self.journal.append({"source": "gui", **run, "status": "failed", "error": repr(error)})
+            results.put(("error", None))
+
+    #Check results of parsing, it repeats until parsing is finished
+    def _poll_parse(self, results, cancel):
+        #Parsing was cancelled, so the results are not needed
+        if cancel.is_set():
+            return
+        progress = None
+        while not results.empty():
+            status, value = results.get()
+            if status == "progress":
+                progress = value
+                continue
+            self._parse_cancel = None
+            self.gui.show_parse_progress(False)
+            if status == "error":
+                self.gui.error_text.configure(text=self.gui._MENU_ERR_WRONG_HTML_CODE_TEXT)
+                return
+            #If all the checks were successful, load the main window
+            self.html_parser, self._parse_run = value
+            #Pasted exports (parser, run) which make the current one
+            self._exports = self.merge_parsers + [value]
+            self.merge_parsers = []
+            previous_fields = None
+            if len(self._exports) > 1:
+                try:
+                    self.html_parser, self._parse_run = self._merge_exports(self._exports)
+                #Wrong merge rule in config.json, the pasted exports are kept, so the export can be pasted again
+                except ValueError as error:
+                    self.merge_parsers = self._exports[:-1]
+                    self.gui.error_text.configure(text=str(error))
+                    return
+                #Fields which were selected before the export was joined stay selected
+                previous_fields = self._get_selected_fields()
+            self.field_model = FieldSelectionModel(self.html_parser.fields_list[1:])
+            if previous_fields:
+                self.field_model.apply_template(previous_fields)
+            self.gui.load_main()
+            return
+        if progress is not None:
+            self.gui.set_parse_progress(progress)
+        self.gui.after(30, self._poll_parse, results, cancel)
+
+    #Join the pasted exports (parser, run), return the joined export and information about the whole run
+    def _merge_exports(self, exports):
+        timer = StageTimer()
+        for _, run in exports:
+            for name, milliseconds in run["stages"].items():
+                timer.add(name, milliseconds)
+        with timer.stage("merge"):
+            merger = ExportMerger([parser for parser, _ in exports], self.config_manager.merge_rules)
+        return merger, {"input_bytes": sum(run["input_bytes"] for _, run in exports), "stages": timer.stages}
+
+    #Go to the menu to paste one more export, it will be joined with the current ones
+    def paste_more(self):
+        self.merge_parsers = list(self._exports)
+        self.change_window(0)
+
+    #Go back to the menu from the main window, the exports are not joined
+    def leave_main(self):
+        self.merge_parsers = []
+        self.change_window(0)
+
+    #Stop parsing, if it is running
+    def cancel_parse(self):
+        if self._parse_cancel:
+            self._parse_cancel.set()
+            self._parse_cancel = None
+            self.gui.show_parse_progress(False)
+    #Write table to excel file, order (names of the columns) is given when the custom order is used
+    def _write_to_excel(self, order=None):
+        #Inputs of the main screen are kept while the custom order screen is shown
+        total_lines = self.gui.column_count_frame_entry.get()
 
         #Checking if it possible to convert the data from the input into a number, 
         #if it is not possible, then the input is invalid and we put 0
@@ -682,52 +2015,120 @@ class App:
         except:
             total_lines = 0
 
-        try:
-            filename = self.gui.file_name_frame_entry.get()
-        except:
-            filename = self.filename
+        filename = self.gui.file_name_frame_entry.get()
         #if the input for the file name is empty, then we set the basic file name students
         if len(filename) == 0:
             filename = "students"
-        self.excel_writer = ExcelWriter(self._data_manager.table,total_lines , self.config_manager.save_folder_path, filename)
-
-    #Handle checkbox, when chekbox is pressed makes the input active or inactive
-    def on_select_checkbox(self, *args):
-            #Get index from args, -1 because we need index 
-            index = int(args[3])-1
-            #Current checkbox
-            element = self.gui.checkboxes_list[index]
-            #Get value from checkbox, 1 or 0
-            value = element.get()
-            if value == 1:
-                #If 1, make same line input active
-                self.gui.entry_list[index].configure(state="normal", fg_color=self.gui._WHITE_COLOR)
-            else:
-                #If 0, clear input and make inactive
-                self.gui.entry_list[index].delete(0, CTk.END)
-                self.gui.entry_list[index].configure(state="disabled", fg_color="#D5D5D5")
+        #The same data manager is used while the selection is not changed, so the data is processed only once
+        data_manager = self._data_manager
+        #Add the table to the workbook, it is written when the workbook is saved
+        if self.collect_workbook == 1:
+            self.workbook_sheets.append((self._get_sheet_name(filename), data_manager.get_table(order), total_lines))
+            return
+        #Processing and writing are done in the export queue
+        folder_path = self.config_manager.save_folder_path
+        writer_class = OUTPUT_WRITERS[self.config_manager.output_format]
+        self.export_queue.submit(filename, self._get_file_key(folder_path, filename, writer_class), self.journal.run, "export", self._export, data_manager, order, total_lines, folder_path, filename, writer_class, self.config_manager.excel_engine, self._parse_run)
+
+    #Process data and write it to the file, it runs in the export queue
+    def _export(self, data_manager, order, total_lines, folder_path, filename, writer_class, engine, parse_run):
+        #Stages of the parsing are in the same record, so the whole run is in one line of the journal
+        timer = StageTimer(parse_run["stages"])
+        parser = data_manager.parser
+        record = {"source": "gui", "name": filename, "input_bytes": parse_run["input_bytes"], "rows": parser.rows_count, "columns": len(parser.fields_list), "backend": parser.backend, "format": writer_class.extension, "engine": engine, "status": "failed"}
+        try:
+            #If the table was already processed, only the order of the columns is changed
+            with timer.stage("process_data"):
+                table = data_manager.get_table(order)
+            writer = writer_class(table, total_lines, folder_path, filename, engine, self.config_manager.update_existing)
+            timer.stages.update(writer.timer.stages)
+            record["table_columns"] = len(table)
+            record["changed_cells"] = writer.changed_cells
+            record["status"] = "done"
+            return writer.path
+        except Exception as error:
+            record["error"] = repr(error)
+            raise
+        finally:
+            record["stages"] = timer.stages
+            self.journal.append(record)
+
+    #Return the key of the file for the export queue, exports to the same file are done one after another
+    def _get_file_key(self, folder_path, filename, writer_class=ExcelWriter):
+        return os.path.normcase(os.path.abspath(writer_class.get_path(folder_path, filename)))
+
+    #Return the name for the sheet, in excel it can be maximum 31 symbols, without []:*?/\ symbols and must be unique
+    def _get_sheet_name(self, filename):
+        name = re.sub(r"[\[\]:*?/\\]", "", filename)[:31] or "Table"
+        names = [sheet[0].lower() for sheet in self.workbook_sheets]
+        number = 2
+        sheet_name = name
+        while sheet_name.lower() in names:
+            sheet_name = f"{name[:26]} ({number})"
+            number += 1
+        return sheet_name
+
+    #Write all collected sheets to one excel file
+    def save_workbook(self):
+        if len(self.workbook_sheets) == 0:
+            return
+        folder_path = self.config_manager.save_folder_path
+        self.export_queue.submit("workbook", self._get_file_key(folder_path, "workbook"), self.journal.run, "workbook", self._export_workbook, self.workbook_sheets, folder_path, self.config_manager.excel_engine)
+        self.workbook_sheets = []
+        self.change_window(3)
+
+    #Write collected sheets to one excel file, it runs in the export queue
+    def _export_workbook(self, sheets, folder_path, engine):
+        record = {"source": "gui", "name": "workbook", "sheets": len(sheets), "engine": engine, "status": "failed"}
+        try:
+            writer = WorkbookWriter(sheets, folder_path, "workbook", engine, self.config_manager.update_existing)
+            record["stages"] = writer.timer.stages
+            record["changed_cells"] = writer.changed_cells
+            record["status"] = "done"
+            return writer.path
+        except Exception as error:
+            record["error"] = repr(error)
+            raise
+        finally:
+            self.journal.append(record)
+
+    #Initializes an array of selected industries, which contains other arrays
+    #First element is the actual name of the field and the second is the desired name
+    def _get_selected_fields(self):
+        #Names of the students must be, so we create them
+        fields_list = [["Opiskelijan nimi"]]
+
+        #loop iterate through all the fields
+        for n,i in enumerate(self.field_model.fields):
+            #Check if field selected
+            if self.field_model.checked[n]:
+                element = [i]
+                #check if desired name not empty
+                if len(self.field_model.aliases[n]) != 0:
+                    element.append(self.field_model.aliases[n])
+                #append element to fields list array
+                fields_list.append(element)
+        return fields_list
 
-    #Set the same state for all checkboxes
+    #Set the same state for all fields
     def select_all_checkboxes(self, value):
-        for n in range(0, len(self.gui.checkboxes_list)):
-            if value == 1:
-                #Select checkbox
-                self.gui.checkboxes_list[n].select()
-                #Make input active
-                self.gui.entry_list[n].configure(state="normal", fg_color=self.gui._WHITE_COLOR)
-            else:
-                #Deselect checkbox
-                self.gui.checkboxes_list[n].deselect()
-                #Clear input
-                self.gui.entry_list[n].delete(0, CTk.END)
-                #Make input inactive
-                self.gui.entry_list[n].configure(state="disabled", fg_color="#D5D5D5")
+        self.field_model.set_all(value == 1)
+        self.gui.field_list.refresh()
+
+    #Save the format of the files selected on the main screen
+    def set_output_format(self, output_format):
+        self.config_manager.output_format = output_format
+        self._file_manager.write_config(self.config_manager)
 
     #Start data processing
     def compilate_data(self):
         #Get custom checkbox order status
         custom_order = self.gui.is_custom_order.get()
-        self._data_manager = DataManager(self)
+        self.collect_workbook = self.gui.is_collect_workbook.get()
+        selected_fields = self._get_selected_fields()
+        #Processed data is kept while the export and the selection are the same
+        if self._data_manager is None or self._data_manager.parser is not self.html_parser or self._data_manager.selected_fields != selected_fields:
+            self._data_manager = DataManager(self.html_parser, self.config_manager, selected_fields, self._field_plans)
 
         #If no field is selected simply stop the function
         if len(self._data_manager.selected_fields) == 0:
@@ -736,14 +2137,10 @@ class App:
         #If the custom order is not selected,
         #then process the data, save it in Excel and load the final window
         if custom_order == 0:
-            self._data_manager.process_data()
             self._write_to_excel()
             self.change_window(3)
         #If a custom order is selected, the program will open a window for custom order
         else:
-            #Save the current text of the input file name
-            self.filename = self.gui.file_name_frame_entry.get()
-            self.total_lines = self.gui.column_count_frame_entry.get()
             self.selected_fields = self._data_manager.selected_fields
             self.change_window(2)
 
@@ -752,85 +2149,44 @@ class App:
         #Ifno configuration, then there will simply be an error text and the program will not continue
         if self.config_manager == None: return
 
+        timer = StageTimer()
         #Try to get data from clipboard
         try:
-            self._html = self.gui.clipboard_get()
+            with timer.stage("clipboard"):
+                html = self.gui.clipboard_get()
         except:
             #
             self.gui.error_text.configure(text=self.gui._MENU_ERR_CANT_GET_CLIPBOARD_TEXT)
             return
 
-        try:
-            self._parse_html()
-        except:
-            self.gui.error_text.configure(text=self.gui._MENU_ERR_WRONG_HTML_CODE_TEXT)
-            return
-        
-        #If all the checks were successful, load the main window
-        self.gui.load_main()
+        #Parse on a separate thread, so the window is not frozen
+        self.gui.error_text.configure(text="")
+        self._parse_cancel = threading.Event()
+        results = queue.Queue()
+        threading.Thread(target=self._parse_html, args=(html, results, self._parse_cancel, timer), daemon=True).start()
+        self.gui.show_parse_progress(True)
+        self.gui.after(30, self._poll_parse, results, self._parse_cancel)
 
     #Select checkboxes and fills inputs using a template
     def select_checkboxes_by_template(self, name):
-        #Get template by name
-        template = self.config_manager.templates[name]
-        #Deselect all checkboxes
-        self.select_all_checkboxes(0)
-        #Iterate template (template is array)
-        for i in template:
-            #Iterate all checkboxes
-            for n2,j in enumerate(self.gui.checkboxes_list):
-                #Get text from checkbox (checkbox text and field name are same)
-                text = j.cget("text")
-                #Checking if field name is the same as text
-                if text == i[0]:
-                    #If yes, select checkbox
-                    j.select()
-                    #Make input active
-                    self.gui.entry_list[n2].configure(state="normal", fg_color=self.gui._WHITE_COLOR)
-                    #If element (array) lenght is 2 its mean that second element is preferred name
-                    if len(i) == 2:
-                        self.gui.entry_list[n2].delete(0, CTk.END)
-                        self.gui.entry_list[n2].insert(0, i[1])
-
-    #Pressing enter switches the focus to the next active input
-    def focus_next_entry(self, event):
-        #Get current input
-        current_widget = event.widget
-        #Find current input index
-        for i, ctk_entry in enumerate(self.gui.entry_list):
-            #If this input current
-            if ctk_entry._entry == current_widget:
-                #Minimum possible index 
-                print(i)
-                next_index = i + 1
-                #Find next acrive index and move cursor
-                while next_index < len(self.gui.entry_list):
-                    #get next input by index
-                    next_widget = self.gui.entry_list[next_index]
-                    #Check if next input is active
-                    if next_widget.cget("state") == "normal":
-                        #Change focus
-                        next_widget.focus_set()
-                        #Stop loop
-                        break
-                    #if next input is disabled add +1 to next index and repeat
-                    next_index += 1
-                break
+        #The whole template is applied to the model, then the visible rows are updated once
+        self.field_model.apply_template(self.config_manager.templates[name])
+        self.gui.field_list.refresh()
+
     #Return list for drag and drop system
     def get_select_fields_for_drag(self):
         #Refactor selected_fields [["chemistry",che"],["physics","phy"],["Math"]] -> ["che","phy","Math"]
-        list = [field[-1] for field in self.selected_fields]
+        #Fields with the same name are one column in the table, so the name is shown once
+        list = dict.fromkeys(field[-1] for field in self.selected_fields)
         #Delete first element because student names always first.
-        del list[0]
+        del list["Opiskelijan nimi"]
         #Return refactored list
-        return list
+        return [*list]
     
     #
     def compilate_ordered_data(self, new_order):
-        new_order = ("Opiskelijan nimi",) + new_order
-        sorted_fields = sorted(self.selected_fields, key=lambda x: new_order.index(x[-1]))
-        self._data_manager.process_data(sorted_fields)
-        self._write_to_excel()
+        #Only the columns are put in the new order, the data is not processed again
+        self._write_to_excel(new_order)
         self.change_window(3)
 
     #Load window by index
@@ -888,10 +2244,8 @@ class App:
 
     #Save new template to config and config file
     def save_tamplate(self, name):
-        #Create an instance of the data manager class
-        data_manager = DataManager(self)
         #Save new template to config
-        self.config_manager.templates[name] = data_manager.selected_fields
+        self.config_manager.templates[name] = self._get_selected_fields()
         #Write new config to config file
         self._file_manager.write_config(self.config_manager)
 
@@ -908,5 +2262,599 @@ class App:
         #Return path
         return os.path.join(base_path, relative_path)
 
+#Counters of the service, they are updated by the threads of the requests and returned by GET /stats
+class ServiceStats:
+    def __init__(self, latencies_count=1000):
+        self._lock = threading.Lock()
+        self.started = time.monotonic()
+        self.counters = {"requests": 0, "done": 0, "failed": 0, "rejected": 0, "bad_requests": 0, "input_bytes": 0, "output_bytes": 0}
+        #Requests which are converted or waiting for a process
+        self.active = 0
+        #Latency of the last requests, percentiles are computed from them
+        self._latencies = collections.deque(maxlen=latencies_count)
+
+    def add(self, name, value=1):
+        with self._lock:
+            self.counters[name] += value
+
+    #Count the request which is given to the pool, it is active until finish is called
+    def start(self):
+        with self._lock:
+            self.active += 1
+
+    #counter is "done", "failed" or "bad_requests", only the done requests have latency and size
+    def finish(self, counter, latency_ms=0, input_bytes=0, output_bytes=0):
+        with self._lock:
+            self.active -= 1
+            self.counters[counter] += 1
+            if counter != "done":
+                return
+            self.counters["input_bytes"] += input_bytes
+            self.counters["output_bytes"] += output_bytes
+            self._latencies.append(latency_ms)
+
+    def to_dict(self):
+        with self._lock:
+            uptime = time.monotonic() - self.started
+            latencies = sorted(self._latencies)
+            stats = {"uptime_s": round(uptime, 1), **self.counters, "active": self.active}
+        #Throughput is counted from the start of the service, latency from the last requests
+        stats["done_per_min"] = round(stats["done"] / uptime * 60, 2) if uptime else 0
+        def percentile(q):
+            return round(latencies[min(len(latencies) - 1, int(q * len(latencies)))], 2)
+        stats["latency_ms"] = {"count": len(latencies), "mean": round(sum(latencies) / len(latencies), 2), "p50": percentile(0.5), "p95": percentile(0.95), "max": round(latencies[-1], 2)} if latencies else {"count": 0}
+        return stats
+
+#Local HTTP service, so the program can run on one computer for all teachers instead of the exe on every laptop
+#POST /convert converts one export and returns the file, GET /stats returns the counters
+#Exports are converted in a pool of processes, the requests over the queue size get 503, results are kept in memory
+class Service:
+    #Content types of the output formats
+    CONTENT_TYPES = {
+        "xlsx": "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
+        "csv": "text/csv; charset=utf-8",
+        "parquet": "application/vnd.apache.parquet",
+        "arrow": "application/vnd.apache.arrow.file",
+    }
+    #Max size of the body of the request
+    MAX_BODY_BYTES = 64 * 1024 * 1024
+
+    def __init__(self, config, journal, jobs=2, queue_size=32):
+        self.config = config
+        self.config_manager = ConfigManager(config)
+        self.journal = journal
+        self.jobs = jobs
+        #Every request holds a slot while it is converted or waits for a process
+        self._slots = threading.BoundedSemaphore(jobs + queue_size)
+        self.stats = ServiceStats()
+        self._executor = None
+
+    #Return the HTTP server, port 0 takes a free port
+    #Pool of processes is started with the server and stopped by close
+    def create_server(self, host="127.0.0.1", port=8765):
+        from http.server import ThreadingHTTPServer
+        self._executor = ProcessPoolExecutor(max_workers=self.jobs)
+        server = ThreadingHTTPServer((host, port), self._create_handler())
+        server.daemon_threads = True
+        return server
+
+    def close(self, server):
+        server.server_close()
+        self._executor.shutdown(cancel_futures=True)
+
+    #Convert the export from the request, return (status, headers, body) of the response
+    #Body is html with template, fields, order, lines, format and name in the query, or json with the same keys and html
+    def convert(self, query, content_type, body):
+        start = time.perf_counter()
+        self.stats.add("requests")
+        try:
+            html, template, order, total_lines, output_format, name = self._parse_request(query, content_type, body)
+        except (ValueError, TypeError, KeyError) as error:
+            self.stats.add("bad_requests")
+            return self._json_response(400, {"error": str(error)})
+        #Queue is full, the client should try again later
+        if not self._slots.acquire(blocking=False):
+            self.stats.add("rejected")
+            status, headers, response = self._json_response(503, {"error": "queue is full"})
+            headers["Retry-After"] = "5"
+            return status, headers, response
+
+        self.stats.start()
+        try:
+            data, record = self._executor.submit(convert_html, html, self.config, template, order, total_lines, output_format).result()
+        #Html of the client is wrong, it is not an error of the service
+        except ExportFormatError as error:
+            self.stats.finish("bad_requests")
+            self.journal.append({"source": "serve", "name": name, "input_bytes": len(body), "format": output_format, "status": "failed", "error": repr(error)})
+            return self._json_response(400, {"error": str(error)})
+        except Exception as error:
+            self.stats.finish("failed")
+            self.journal.append({"source": "serve", "name": name, "input_bytes": len(body), "format": output_format, "status": "failed", "error": repr(error)})
+            return self._json_response(500, {"error": "export could not be written"})
+        finally:
+            self._slots.release()
+        latency_ms = (time.perf_counter() - start) * 1000
+        self.stats.finish("done", latency_ms, len(body), len(data))
+        self.journal.append({"source": "serve", "name": name, "input_bytes": len(body), "output_bytes": len(data), "latency_ms": round(latency_ms, 2), **record})
+        headers = {"Content-Type": self.CONTENT_TYPES[output_format], "Content-Disposition": f'attachment; filename="{name}.{OUTPUT_WRITERS[output_format].extension}"'}
+        return 200, headers, data
+
+    #Return arguments of the conversion from the request, ValueError if the request is wrong
+    def _parse_request(self, query, content_type, body):
+        from urllib.parse import parse_qs
+        request = {name: values[-1] for name, values in parse_qs(query).items()}
+        if content_type.split(";")[0].strip() == "application/json":
+            request.update(json.loads(body))
+        else:
+            request["html"] = body.decode("utf-8", errors="replace")
+            #Lists in the query are separated by commas
+            for key in ("fields", "order"):
+                if key in request:
+                    request[key] = [value for value in request[key].split(",") if value]
+
+        html = request.get("html")
+        if not isinstance(html, str) or not html.strip():
+            raise ValueError("html is empty")
+        #A string would be read as a list of letters
+        for key in ("fields", "order"):
+            if request.get(key) is not None and not isinstance(request[key], list):
+                raise ValueError(f"{key} must be a list")
+        #Template from config.json or the fields with the desired names, like [["Geometria", "III"], "Yhtälöt"]
+        if "fields" in request:
+            if not all(isinstance(field, (str, list)) for field in request["fields"]):
+                raise ValueError("field must be a name or a list [name, desired name]")
+            template = [[field] if isinstance(field, str) else [str(name) for name in field] for field in request["fields"]]
+        elif request.get("template") in self.config_manager.templates:
+            template = self.config_manager.templates[request["template"]]
+        else:
+            raise ValueError(f"template not found: {request.get('template')}")
+        order = request.get("order")
+        if order is not None:
+            order = [str(name) for name in order]
+        total_lines = int(request.get("lines", 0))
+        output_format = request.get("format", self.config_manager.output_format)
+        if output_format not in OUTPUT_WRITERS:
+            raise ValueError(f"unknown format: {output_format}")
+        name = re.sub(r"[^\w.-]", "_", str(request.get("name", "students"))) or "students"
+        return html, template, order, total_lines, output_format, name
+
+    def _json_response(self, status, data):
+        return status, {"Content-Type": "application/json"}, json.dumps(data, ensure_ascii=False).encode("utf-8")
+
+    #Return the class of the request handler, server creates one object of it for every request
+    def _create_handler(self):
+        from http.server import BaseHTTPRequestHandler
+        service = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                if self.path.split("?")[0] == "/stats":
+                    self._send(*service._json_response(200, service.stats.to_dict()))
+                else:
+                    self._send(*service._json_response(404, {"error": "not found"}))
+
+            def do_POST(self):
+                path, _, query = self.path.partition("?")
+                if path != "/convert":
+                    self._send(*service._json_response(404, {"error": "not found"}))
+                    return
+                try:
+                    length = int(self.headers.get("Content-Length", ""))
+                except ValueError:
+                    self._send(*service._json_response(411, {"error": "Content-Length is needed"}))
+                    return
+                if length > service.MAX_BODY_BYTES:
+                    self._send(*service._json_response(413, {"error": "request is too big"}))
+                    return
+                self._send(*service.convert(query, self.headers.get("Content-Type", ""), self.rfile.read(length)))
+
+            def _send(self, status, headers, body):
+                self.send_response(status)
+                for name, value in headers.items():
+                    self.send_header(name, value)
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+        return Handler
+
+#Return selected fields by a template, in the same order as the fields are in the html,
+#the same way they are selected with the template button on the main screen
+def select_template_fields(fields_list, template):
+    template_fields = {field[0]: field for field in template}
+    return [["Opiskelijan nimi"]] + [list(template_fields[name]) for name in fields_list[1:] if name in template_fields]
+
+#Parse one saved export, it runs in a separate process so it is a plain function
+def parse_file(path, backend, normalizer=None):
+    with open(path, encoding="utf-8", errors="replace") as file:
+        return HtmlParcer(file.read(), backend, normalizer=normalizer)
+
+#Plans of the fields in the worker process, exports of the same layout are matched once per process
+_worker_field_plans = FieldPlanCache()
+
+#Convert one saved export to a file of the output format, it runs in a separate process so it is a plain function
+#Return the path of the file and the record of the run for the journal
+def convert_file(path, config, template_name, folder_path, total_lines):
+    config_manager = ConfigManager(config)
+    timer = StageTimer()
+    with timer.stage("read_file"):
+        with open(path, encoding="utf-8", errors="replace") as file:
+            html = file.read()
+    with timer.stage("parse"):
+        html_parser = HtmlParcer(html, config_manager.html_parser, normalizer=CellNormalizer(config_manager.mark_map, config_manager.cast_numbers))
+    selected_fields = select_template_fields(html_parser.fields_list, config_manager.templates[template_name])
+    data_manager = DataManager(html_parser, config_manager, selected_fields, _worker_field_plans)
+    with timer.stage("process_data"):
+        data_manager.process_data()
+    writer = OUTPUT_WRITERS[config_manager.output_format](data_manager.table, total_lines, folder_path, Path(path).stem, config_manager.excel_engine, config_manager.update_existing)
+    timer.stages.update(writer.timer.stages)
+    record = {"source": "batch", "name": Path(path).name, "input_bytes": len(html.encode("utf-8", "surrogatepass")), "rows": html_parser.rows_count, "columns": len(html_parser.fields_list), "backend": html_parser.backend, "format": config_manager.output_format, "engine": config_manager.excel_engine, "table_columns": len(data_manager.table), "changed_cells": writer.changed_cells, "status": "done", "stages": timer.stages, "peak_rss_kb": get_peak_rss_kb()}
+    return writer.path, record
+
+#Convert html of the service request, it runs in a separate process so it is a plain function
+#Return the file in bytes and the record of the run for the journal, nothing is written to the disk
+def convert_html(html, config, template, order, total_lines, output_format):
+    import io
+    config_manager = ConfigManager(config)
+    timer = StageTimer()
+    with timer.stage("parse"):
+        html_parser = HtmlParcer(html, config_manager.html_parser, normalizer=CellNormalizer(config_manager.mark_map, config_manager.cast_numbers))
+    data_manager = DataManager(html_parser, config_manager, select_template_fields(html_parser.fields_list, template), _worker_field_plans)
+    with timer.stage("process_data"):
+        table = data_manager.get_table(order)
+    file = io.BytesIO()
+    writer = OUTPUT_WRITERS[output_format](table, total_lines, "", "students", config_manager.excel_engine, file=file)
+    timer.stages.update(writer.timer.stages)
+    record = {"rows": html_parser.rows_count, "columns": len(html_parser.fields_list), "backend": html_parser.backend, "format": output_format, "engine": config_manager.excel_engine, "table_columns": len(table), "status": "done", "stages": timer.stages, "peak_rss_kb": get_peak_rss_kb()}
+    return file.getvalue(), record
+
+#Class for running the program from the command line without the window
+class CommandLine:
+    def __init__(self, argv):
+        self._file_manager = FileManager()
+        self.config_manager = ConfigManager(self._file_manager.config)
+        args = self._create_parser().parse_args(argv)
+        sys.exit(args.handler(args))
+
+    def _create_parser(self):
+        parser = argparse.ArgumentParser(prog="teacher-helper")
+        subparsers = parser.add_subparsers(required=True)
+
+        #Options of the commands which write files, they are the same for batch, merge and watch
+        output_options = argparse.ArgumentParser(add_help=False)
+        output_options.add_argument("-o", "--output", default=self.config_manager.save_folder_path, help="folder to save the files to")
+        output_options.add_argument("-l", "--lines", type=int, default=0, help="number of lines in the table")
+        #Actions of the parent are shared by the commands, so the default of jobs is set by every command in its handler
+        output_options.add_argument("-j", "--jobs", type=int, help="number of processes, by default one per core (2 for watch)")
+        output_options.add_argument("-u", "--update", action="store_true", help="update existing excel files, only changed cells are written")
+        output_options.add_argument("-f", "--format", choices=list(OUTPUT_WRITERS), default=self.config_manager.output_format, help="format of the output files")
+        template_options = argparse.ArgumentParser(add_help=False)
+        template_options.add_argument("-t", "--template", required=True, help="template name from config.json")
+
+        batch = subparsers.add_parser("batch", parents=[template_options, output_options], help="convert saved html exports to excel files")
+        batch.add_argument("inputs", nargs="+", help="html files, folders or glob patterns")
+        batch.set_defaults(handler=self._batch)
+
+        merge = subparsers.add_parser("merge", parents=[template_options, output_options], help="join several html exports into one excel file by the names of the students")
+        merge.add_argument("inputs", nargs="+", help="html files, folders or glob patterns, the first file wins conflicts by default")
+        merge.add_argument("-n", "--name", default="merged", help="name of the output file")
+        merge.set_defaults(handler=self._merge)
+
+        watch = subparsers.add_parser("watch", parents=[output_options], help="convert html exports which are saved to a folder, until stopped with Ctrl+C")
+        watch.add_argument("folder", help="folder to watch, subfolders are watched too")
+        watch.add_argument("-t", "--template", help="template for the files without a sidecar or a rule")
+        watch.add_argument("--interval", type=float, default=2, help="seconds between checks of the folder")
+        watch.add_argument("--settle", type=float, default=3, help="seconds the file must stay unchanged before it is converted")
+        watch.add_argument("--once", action="store_true", help="convert the waiting files and exit")
+        watch.set_defaults(handler=self._watch)
+
+        serve = subparsers.add_parser("serve", help="run a local http service which converts exports sent to it")
+        serve.add_argument("--host", default="127.0.0.1", help="address to listen on, 0.0.0.0 for all computers of the network")
+        serve.add_argument("--port", type=int, default=8765)
+        serve.add_argument("-j", "--jobs", type=int, default=os.cpu_count(), help="number of processes")
+        serve.add_argument("-q", "--queue", type=int, default=32, help="number of requests which can wait for a process, others get 503")
+        serve.set_defaults(handler=self._serve)
+        return parser
+
+    #Find html files by the paths, folders and glob patterns
+    def _find_files(self, inputs):
+        files = []
+        for i in inputs:
+            if os.path.isdir(i):
+                files += sorted(glob.glob(os.path.join(i, "*.html")) + glob.glob(os.path.join(i, "*.htm")))
+            else:
+                files += sorted(glob.glob(i))
+        #Remove duplicates but keep the order
+        return list(dict.fromkeys(files))
+
+    #Print the error and return False if the template is not in config.json
+    def _check_template(self, template):
+        if template not in self.config_manager.templates:
+            print(f"Template not found: {template}", file=sys.stderr)
+            return False
+        return True
+
+    #Return config for the conversion, options of the command line replace the values of config.json
+    def _get_config(self, args):
+        config = dict(self._file_manager.config, output_format=args.format)
+        if args.update:
+            config["update_existing"] = True
+        return config
+
+    def _create_journal(self):
+        return RunJournal(self._file_manager.logs_folder, self.config_manager.run_journal_kb * 1024)
+
+    #Print the wrong aggregation policies of config.json, return False if there are any
+    def _check_aggregation(self):
+        is_valid = True
+        for field, policy in self.config_manager.aggregation.items():
+            if policy not in DataManager.POLICIES:
+                print(f"Wrong aggregation policy of {field}: {policy}, use one of {', '.join(DataManager.POLICIES)}", file=sys.stderr)
+                is_valid = False
+        return is_valid
+
+    #Print the inputs which would be written to the same output file, for example ryhma.html from two folders
+    #Return False if there are any, otherwise one file would silently replace the other
+    def _check_output_paths(self, files, folder, output_format):
+        inputs = {}
+        for path in files:
+            output_path = os.path.normcase(os.path.abspath(OUTPUT_WRITERS[output_format].get_path(folder, Path(path).stem)))
+            inputs.setdefault(output_path, []).append(path)
+        is_valid = True
+        for output_path, paths in inputs.items():
+            if len(paths) > 1:
+                print(f"Files are written to the same file {output_path}: {', '.join(paths)}", file=sys.stderr)
+                is_valid = False
+        return is_valid
+
+    #Create the output folder once before the work starts, so the processes do not fail on a missing folder
+    #Return False if the folder cannot be created
+    def _create_output_folder(self, folder):
+        if not folder:
+            return True
+        try:
+            os.makedirs(folder, exist_ok=True)
+        except OSError as error:
+            print(f"Cannot create folder {folder}: {error}", file=sys.stderr)
+            return False
+        return True
+
+    #Convert all the files in a pool of processes, one file per process at a time
+    def _batch(self, args):
+        if not self._check_template(args.template):
+            return 2
+        files = self._find_files(args.inputs)
+        if len(files) == 0:
+            print("No html files found", file=sys.stderr)
+            return 2
+        if not self._check_aggregation() or not self._check_output_paths(files, args.output, args.format) or not self._create_output_folder(args.output):
+            return 2
+
+        config = self._get_config(args)
+        journal = self._create_journal()
+        failed = 0
+        with ProcessPoolExecutor(max_workers=max(1, min(args.jobs or os.cpu_count(), len(files)))) as executor:
+            futures = {executor.submit(convert_file, path, config, args.template, args.output, args.lines): path for path in files}
+            for future in as_completed(futures):
+                if not self._report(future, futures[future], journal, "batch"):
+                    failed += 1
+        print(f"Converted {len(files) - failed} of {len(files)} files")
+        return 1 if failed else 0
+
+    #Parse all the files in a pool of processes, join them and write one file
+    def _merge(self, args):
+        if not self._check_template(args.template):
+            return 2
+        files = self._find_files(args.inputs)
+        if len(files) == 0:
+            print("No html files found", file=sys.stderr)
+            return 2
+        #Rules are checked before the files are parsed
+        try:
+            ExportMerger.check_rules(self.config_manager.merge_rules)
+        except ValueError as error:
+            print(error, file=sys.stderr)
+            return 2
+        if not self._check_aggregation() or not self._create_output_folder(args.output):
+            return 2
+
+        config_manager = ConfigManager(self._get_config(args))
+        journal = self._create_journal()
+        timer = StageTimer()
+        with timer.stage("parse"):
+            with ProcessPoolExecutor(max_workers=max(1, min(args.jobs or os.cpu_count(), len(files)))) as executor:
+                normalizer = CellNormalizer(self.config_manager.mark_map, self.config_manager.cast_numbers)
+                parsers = list(executor.map(parse_file, files, [self.config_manager.html_parser] * len(files), [normalizer] * len(files)))
+        with timer.stage("merge"):
+            merger = ExportMerger(parsers, self.config_manager.merge_rules)
+        selected_fields = select_template_fields(merger.fields_list, self.config_manager.templates[args.template])
+        data_manager = DataManager(merger, self.config_manager, selected_fields)
+        with timer.stage("process_data"):
+            data_manager.process_data()
+        writer = OUTPUT_WRITERS[config_manager.output_format](data_manager.table, args.lines, args.output, args.name, config_manager.excel_engine, config_manager.update_existing)
+        timer.stages.update(writer.timer.stages)
+        journal.append({"source": "merge", "name": args.name, "format": args.format, "exports": len(files), "rows": merger.rows_count, "columns": len(merger.fields_list), "table_columns": len(data_manager.table), "changed_cells": writer.changed_cells, "status": "done", "stages": timer.stages})
+        print(f"Merged {len(files)} files, {merger.rows_count} students -> {writer.path}")
+        return 0
+
+    #Print the result of the conversion and add it to the journal, return False if the conversion failed
+    def _report(self, future, path, journal, source):
+        try:
+            output_path, record = future.result()
+        except Exception as error:
+            journal.append({"source": source, "name": Path(path).name, "status": "failed", "error": repr(error)})
+            print(f"{path}: {error!r}", file=sys.stderr)
+            return False
+        record["source"] = source
+        journal.append(record)
+        print(f"{path} -> {output_path}")
+        return True
+
+    #Return the template of the file: name from the sidecar file (export.template next to export.html),
+    #then the first rule of config.json which matches the path in the folder, then the default template
+    #Raise OSError or UnicodeDecodeError if the sidecar cannot be read
+    def _get_watch_template(self, path, folder, default):
+        sidecar = os.path.splitext(path)[0] + ".template"
+        if os.path.exists(sidecar):
+            with open(sidecar, encoding="utf-8") as file:
+                return file.read().strip()
+        relative_path = os.path.relpath(path, folder).replace(os.sep, "/")
+        for pattern, template in self.config_manager.watch_rules.items():
+            if fnmatch.fnmatch(relative_path, pattern):
+                return template
+        return default
+
+    #Return {path: (modification time, size)} of the html files in the folder and subfolders
+    def _scan_folder(self, folder):
+        files = {}
+        for root, _, names in os.walk(folder):
+            for name in names:
+                if name.lower().endswith((".html", ".htm")):
+                    path = os.path.join(root, name)
+                    try:
+                        stat = os.stat(path)
+                    except OSError:
+                        continue
+                    files[path] = (stat.st_mtime_ns, stat.st_size)
+        return files
+
+    #Return (folder, path) of the output file of the html, subfolders of the watched folder are made in the output folder too,
+    #so the exports with the same name in two subfolders are not written to one file
+    def _get_watch_output(self, path, folder, output, output_format):
+        output_folder = os.path.normpath(os.path.join(output or ".", os.path.relpath(os.path.dirname(path), folder)))
+        return output_folder, OUTPUT_WRITERS[output_format].get_path(output_folder, Path(path).stem)
+
+    #Watch the folder and convert new and changed files, a file is converted when it has not changed for settle seconds,
+    #so the files which are still being saved are not read
+    def _watch(self, args):
+        if not os.path.isdir(args.folder):
+            print(f"Folder not found: {args.folder}", file=sys.stderr)
+            return 2
+        if args.template and not self._check_template(args.template):
+            return 2
+        if not self._check_aggregation() or not self._create_output_folder(args.output):
+            return 2
+
+        config = self._get_config(args)
+        journal = self._create_journal()
+        #Folder is watched for a long time, so it does not take all the cores by default
+        jobs = max(1, args.jobs or 2)
+        #Files are kept by (html path, output path), files which are converted already are in done,
+        #the output files which are newer than the html are not written again
+        done = {}
+        for path, signature in self._scan_folder(args.folder).items():
+            output_path = self._get_watch_output(path, args.folder, args.output, args.format)[1]
+            if os.path.exists(output_path) and os.stat(output_path).st_mtime_ns >= signature[0]:
+                done[(path, output_path)] = signature
+        #Changed files {key: (signature, time when it was seen)}, and files which are converted now {future: (key, signature)}
+        waiting = {}
+        running = {}
+        #Files which failed {key: (signature, time of the next try, number of tries)}, for example the excel file was open,
+        #they are tried again later and at once when the html is changed, with --once they are only counted
+        failed = {}
+        failed_count = 0
+        print(f"Watching {os.path.abspath(args.folder)}, press Ctrl+C to stop")
+        with ProcessPoolExecutor(max_workers=jobs) as executor:
+            try:
+                while True:
+                    now = time.monotonic()
+                    running_keys = {key for key, _ in running.values()}
+                    #Output files which are written now, one file is never written by two processes
+                    running_outputs = {os.path.normcase(os.path.abspath(key[1])) for key in running_keys}
+                    #Html files by the output file, ryhma.html and ryhma.htm in one folder would be written to the same file
+                    outputs = {}
+                    for path, signature in self._scan_folder(args.folder).items():
+                        key = (path, self._get_watch_output(path, args.folder, args.output, args.format)[1])
+                        outputs.setdefault(os.path.normcase(os.path.abspath(key[1])), []).append(path)
+                        if done.get(key) == signature or key in running_keys:
+                            continue
+                        if key in failed and failed[key][0] == signature and now < failed[key][1]:
+                            continue
+                        #The file is changed again, so the waiting starts again
+                        if key not in waiting or waiting[key][0] != signature:
+                            waiting[key] = (signature, now)
+
+                    #Files which are ready are given to the pool, but not more than the number of processes
+                    for key, (signature, seen) in list(waiting.items()):
+                        if len(running) >= jobs:
+                            break
+                        if now - seen < args.settle and not args.once:
+                            continue
+                        path, output_path = key
+                        output_key = os.path.normcase(os.path.abspath(output_path))
+                        if output_key in running_outputs:
+                            continue
+                        del waiting[key]
+                        #Sidecar can be locked, deleted or saved in another encoding, it must not stop the watching
+                        template_error = None
+                        try:
+                            template = self._get_watch_template(path, args.folder, args.template)
+                        except (OSError, UnicodeDecodeError) as error:
+                            template, template_error = None, error
+                        others = [other for other in outputs.get(output_key, []) if other != path]
+                        #Template can be added later with a sidecar or a rule, so these files are tried again too
+                        if others:
+                            print(f"{path}: written to the same file {output_path} as {', '.join(others)}, rename one of them", file=sys.stderr)
+                        elif template_error:
+                            print(f"{path}: cannot read {Path(path).stem}.template: {template_error!r}", file=sys.stderr)
+                        elif template is None:
+                            print(f"{path}: no template, add {Path(path).stem}.template, a rule to watch_rules or use -t", file=sys.stderr)
+                        elif template not in self.config_manager.templates:
+                            print(f"{path}: template not found: {template}", file=sys.stderr)
+                        elif self._create_output_folder(os.path.dirname(output_path)):
+                            running[executor.submit(convert_file, path, config, template, os.path.dirname(output_path), args.lines)] = (key, signature)
+                            running_outputs.add(output_key)
+                            continue
+                        failed_count += 1
+                        self._add_failed(failed, key, signature, args.once, done)
+
+                    for future in [future for future in running if future.done()]:
+                        key, signature = running.pop(future)
+                        if self._report(future, key[0], journal, "watch"):
+                            failed.pop(key, None)
+                            done[key] = signature
+                        else:
+                            failed_count += 1
+                            self._add_failed(failed, key, signature, args.once, done)
+
+                    if args.once and not waiting and not running:
+                        return 1 if failed_count else 0
+                    time.sleep(0.1 if args.once else args.interval)
+            except KeyboardInterrupt:
+                print("Stopped")
+                return 0
+
+    #Add the failed file, it is tried again after a delay which doubles after every try, up to 5 minutes
+    #With --once it is not tried again, so it is added to the done files
+    def _add_failed(self, failed, key, signature, is_once, done):
+        if is_once:
+            done[key] = signature
+            return
+        tries = failed[key][2] + 1 if key in failed and failed[key][0] == signature else 1
+        failed[key] = (signature, time.monotonic() + min(5 * 2 ** (tries - 1), 300), tries)
+
+    #Run the http service until Ctrl+C
+    def _serve(self, args):
+        if not self._check_aggregation():
+            return 2
+        journal = self._create_journal()
+        service = Service(self._file_manager.config, journal, max(1, args.jobs), max(0, args.queue))
+        server = service.create_server(args.host, args.port)
+        host, port = server.server_address[:2]
+        print(f"Serving on http://{host}:{port}, press Ctrl+C to stop")
+        try:
+            server.serve_forever()
+        except KeyboardInterrupt:
+            print("Stopped")
+        finally:
+            service.close(server)
+        return 0
+
 if __name__ == "__main__":
-    app = App()
\ No newline at end of file
+    #Needed for the process pool when the program is built into one exe file
+    multiprocessing.freeze_support()
+    #With arguments the program runs from the command line, without them the window is opened
+    if len(sys.argv) > 1:
+        CommandLine(sys.argv[1:])
+    else:
+        app = App()
\ No newline at end of file
@@ -0,0 +1,55 @@
+#Tests of parsing the gradebook export
+#Run from the root of the repository: python -m pytest -q
+import importlib.util
+import os
+import sys
+
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.join(ROOT, "tools"))
+
+import main as teacher_helper
+from gradebook_generator import generate
+
+
+@pytest.fixture(scope="module")
+def html():
+    return generate(students=40, courses=20, duplicates=2)
+
+
+#All backends must give the same fields and the same grid, otherwise the output depends on what is installed
+@pytest.mark.parametrize("backend", teacher_helper.HTML_PARSER_BACKENDS)
+def test_backends_give_identical_output(html, backend):
+    if backend != "html.parser" and importlib.util.find_spec(backend) is None:
+        pytest.skip(f"{backend} is not installed")
+    reference = teacher_helper.HtmlParcer(html, backend="html.parser")
+    parser = teacher_helper.HtmlParcer(html, backend=backend)
+    assert parser.backend == backend
+    assert parser.fields_list == reference.fields_list
+    assert parser.columns == reference.columns
+    assert parser.rows_count == reference.rows_count == 40
+
+
+#Cleaning of cells: nbsp and spaces are stripped, marks are mapped case-insensitively, whole numbers are cast
+def test_normalizer_default_rules():
+    normalizer = teacher_helper.CellNormalizer()
+    cells = ["\xa09\xa0", "o", "O ", "a\x1fb", "hyv.", "", "10", "½"]
+    assert normalizer.normalize_column(cells) == [9, "X", "X", "ab", "hyv", "", 10, "½"]
+
+
+def test_normalizer_mark_map():
+    normalizer = teacher_helper.CellNormalizer(mark_map={"o": "X", "hyv.": "H"})
+    assert normalizer.normalize_column(["hyv.", "HYV.", "o"]) == ["H", "H", "X"]
+
+
+#The separator used to join a column must not change the number of cells
+def test_normalizer_keeps_cells_with_separator():
+    normalizer = teacher_helper.CellNormalizer()
+    assert normalizer.normalize_column(["a\x1fb", "\x1f", "5"]) == ["ab", "", 5]
+
+
+def test_normalizer_without_number_casting():
+    normalizer = teacher_helper.CellNormalizer(cast_numbers=False)
+    assert normalizer.normalize_column(["10", " 7\xa0", "o"]) == ["10", "7", "X"]
@@ -0,0 +1,118 @@
+#Benchmark of the pipeline on synthetic gradebooks
+#Times parsing, process_data and writing of the excel file separately for every size tier,
+#peak memory is the peak of Python allocations during the stage (tracemalloc), memory of C libraries is not counted
+#Usage: python tools/benchmark.py [--tiers small,medium] [--repeat 3] [--backend lxml] [--engine stream] [--output results.json] [--compare old.json]
+import argparse
+import json
+import os
+import platform
+import sys
+import tempfile
+import time
+import tracemalloc
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import main as teacher_helper
+from gradebook_generator import generate
+
+#Size tiers (students, courses, groups of duplicates)
+TIERS = {
+    "small": (30, 20, 1),
+    "medium": (300, 60, 3),
+    "large": (1500, 120, 6),
+    "huge": (5000, 200, 10),
+}
+
+STAGES = ["parse", "process_data", "write"]
+
+#Run function and return (result, milliseconds, peak memory in bytes)
+#Tracing of the memory slows the code down, so the time is measured only when the memory is not traced
+def measure(function, trace=False):
+    if trace:
+        tracemalloc.start()
+    start = time.perf_counter()
+    result = function()
+    milliseconds = (time.perf_counter() - start) * 1000
+    peak = 0
+    if trace:
+        peak = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+    return result, milliseconds, peak
+
+#Run all stages once and return {stage: (milliseconds, peak memory)}
+def run_once(html, config_manager, folder_path, backend, engine, trace=False):
+    html_parser, parse_ms, parse_peak = measure(lambda: teacher_helper.HtmlParcer(html, backend), trace)
+    #All fields are selected, like when "Kaikki" is clicked
+    selected_fields = [[field] for field in html_parser.fields_list]
+    data_manager = teacher_helper.DataManager(html_parser, config_manager, selected_fields)
+    _, process_ms, process_peak = measure(data_manager.process_data, trace)
+    _, write_ms, write_peak = measure(lambda: teacher_helper.ExcelWriter(data_manager.table, 0, folder_path, "benchmark", engine), trace)
+    return {"parse": (parse_ms, parse_peak), "process_data": (process_ms, process_peak), "write": (write_ms, write_peak)}
+
+#Return results of the tier, time is the best of the runs and memory is taken from one more run with tracing
+def run_tier(name, repeat, backend, engine):
+    students, courses, duplicates = TIERS[name]
+    html = generate(students, courses, duplicates)
+    config_manager = teacher_helper.ConfigManager({"templates": {}, "save_folder_path": ""})
+    with tempfile.TemporaryDirectory() as folder_path:
+        runs = [run_once(html, config_manager, folder_path, backend, engine) for _ in range(repeat)]
+        traced_run = run_once(html, config_manager, folder_path, backend, engine, trace=True)
+    result = {"students": students, "courses": courses, "duplicates": duplicates, "html_bytes": len(html.encode("utf-8")), "stages": {}}
+    for stage in STAGES:
+        result["stages"][stage] = {
+            "ms": round(min(run[stage][0] for run in runs), 2),
+            "peak_kb": round(traced_run[stage][1] / 1024, 1),
+        }
+    return result
+
+#Print results, with the change from the old results if they are given
+def print_results(results, old_results=None):
+    for name, tier in results["tiers"].items():
+        print(f"{name}: {tier['students']} students, {tier['courses']} courses, {tier['html_bytes'] / 1024:.0f} KB")
+        for stage, values in tier["stages"].items():
+            line = f"  {stage:<13} {values['ms']:10.1f} ms {values['peak_kb']:12.1f} KB"
+            old = (old_results or {}).get("tiers", {}).get(name, {}).get("stages", {}).get(stage)
+            if old and old["ms"]:
+                line += f"  {values['ms'] / old['ms']:6.2f}x time  {values['peak_kb'] / max(old['peak_kb'], 0.1):6.2f}x memory"
+            print(line)
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--tiers", default="small,medium,large", help=f"comma separated tiers: {', '.join(TIERS)}")
+    parser.add_argument("--repeat", type=int, default=3, help="number of runs of every tier, the best time is shown")
+    parser.add_argument("--backend", default="auto", help="html parser backend")
+    parser.add_argument("--engine", default="pandas", help="excel engine, pandas or stream")
+    parser.add_argument("--output", help="save results to json file")
+    parser.add_argument("--compare", help="json file of an earlier run to compare with")
+    args = parser.parse_args()
+
+    tiers = [name.strip() for name in args.tiers.split(",") if name.strip()]
+    for name in tiers:
+        if name not in TIERS:
+            parser.error(f"unknown tier {name}")
+
+    results = {
+        "created": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "backend": args.backend,
+        "engine": args.engine,
+        "repeat": args.repeat,
+        "tiers": {name: run_tier(name, args.repeat, args.backend, args.engine) for name in tiers},
+    }
+
+    old_results = None
+    if args.compare:
+        with open(args.compare, encoding="utf-8") as file:
+            old_results = json.load(file)
+    print_results(results, old_results)
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as file:
+            json.dump(results, file, indent=2)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,68 @@
+#Generator of synthetic gradebook exports
+#Makes html in the same shape as the Wilma page which is copied by the teacher: th.center headers with
+#json in data-tooltip and student rows with the name in a link, so it can be parsed by HtmlParcer
+#Usage: python tools/gradebook_generator.py out.html [--students 300] [--courses 60] [--duplicates 3] [--seed 1]
+import argparse
+import html
+import json
+import random
+
+COURSE_NAMES = ["Peruslaskutoimitukset", "Yhtälöt", "Geometria", "Talousmatematiikka", "Fysiikka", "Kemia", "Biologia", "Maantieto", "Historia", "Yhteiskuntaoppi", "Äidinkieli", "Englanti", "Ruotsi", "Liikunta", "Musiikki", "Kuvataide"]
+FIRST_NAMES = ["Aino", "Eetu", "Emma", "Onni", "Sofia", "Leo", "Helmi", "Elias", "Venla", "Väinö", "Ella", "Oliver"]
+LAST_NAMES = ["Korhonen", "Virtanen", "Mäkinen", "Nieminen", "Mäkelä", "Hämäläinen", "Laine", "Heikkinen", "Koskinen", "Järvinen"]
+#Marks and how often they are in the cells, "o" is a passed course, hyv. is accepted and empty cell is not done yet
+MARKS = ["", "4", "5", "6", "7", "8", "9", "10", "o", "O", "hyv.", "S"]
+MARK_WEIGHTS = [30, 2, 4, 8, 12, 14, 10, 5, 8, 2, 3, 2]
+
+#Return names of the courses, in every group of duplicates the same name is used by several courses
+def get_course_names(courses, duplicates, rng):
+    names = [COURSE_NAMES[n % len(COURSE_NAMES)] if n < len(COURSE_NAMES) else f"{COURSE_NAMES[n % len(COURSE_NAMES)]} {n // len(COURSE_NAMES) + 1}" for n in range(courses)]
+    for group in range(min(duplicates, courses // 2)):
+        #Every group has 2 or 3 courses with the name of the first one
+        size = min(rng.choice([2, 3]), courses - group * 3)
+        for n in range(1, size):
+            names[group * 3 + n] = names[group * 3]
+    return names
+
+#Return header cell of the course, tooltip is json like on the real page
+def get_header_cell(number, name, rng):
+    tooltip = {"Opintojakson/tutkinnon osan nimi": name, "Laajuus": f"{rng.choice([1, 2, 3])} ov"}
+    #Most of the courses are required (pak) and some are optional, in some exports the code is missing
+    code = rng.choices(["pak", "val", None], weights=[6, 3, 1])[0]
+    if code:
+        tooltip["Koodi"] = code
+    return f'<th class="center" data-tooltip="{html.escape(json.dumps(tooltip, ensure_ascii=False))}">{number}</th>'
+
+#Return mark cell, the real page has spaces and no-break spaces around the marks
+def get_mark_cell(rng):
+    mark = rng.choices(MARKS, weights=MARK_WEIGHTS)[0]
+    padding = rng.choice(["", " ", "\xa0"])
+    return f'<td class="center"><span title="{mark}">{padding}{mark}{padding}</span></td>'
+
+#Return html of the gradebook
+def generate(students=300, courses=60, duplicates=3, seed=1):
+    rng = random.Random(seed)
+    names = get_course_names(courses, duplicates, rng)
+    header = "<tr><th>Opiskelija</th>" + "".join(get_header_cell(n + 1, name, rng) for n, name in enumerate(names)) + "</tr>"
+    #First row of the body is the summary of the courses, parser skips it
+    rows = ["<tr><td>Yhteensä</td>" + "".join(f'<td class="center">{rng.randint(0, students)}</td>' for _ in range(courses)) + "</tr>"]
+    for n in range(students):
+        student = f"{rng.choice(LAST_NAMES)} {rng.choice(FIRST_NAMES)} {n + 1}"
+        rows.append(f'<tr><td><a href="/profiles/students/{n + 1}">{html.escape(student)}</a></td>' + "".join(get_mark_cell(rng) for _ in range(courses)) + "</tr>")
+    #Menu and other parts of the page are copied too, they are not needed but make the html bigger
+    page = "".join(f'<li><a href="/page/{n}">Sivu {n}</a></li>' for n in range(200))
+    return f'<!DOCTYPE html><html><head><meta charset="utf-8"><title>Wilma</title></head><body><nav><ul>{page}</ul></nav><table class="table"><thead>{header}</thead><tbody>{"".join(rows)}</tbody></table></body></html>'
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("output", help="path of the html file")
+    parser.add_argument("--students", type=int, default=300)
+    parser.add_argument("--courses", type=int, default=60)
+    parser.add_argument("--duplicates", type=int, default=3, help="number of groups of courses with the same name")
+    parser.add_argument("--seed", type=int, default=1)
+    args = parser.parse_args()
+    with open(args.output, "w", encoding="utf-8") as file:
+        file.write(generate(args.students, args.courses, args.duplicates, args.seed))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,76 @@
+#Startup timing harness
+#Shows import time of every top level module imported by main.py and time to the first frame of the window
+#Usage: python tools/startup_timing.py [--runs 5] [--top 15] [--json]
+import argparse
+import json
+import os
+import subprocess
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+#Code for the child process, the window is drawn once and closed instead of running the main loop
+FIRST_FRAME_CODE = """
+import json, sys, time
+start = time.perf_counter()
+import main
+imported = time.perf_counter()
+def mainloop(self, *args):
+    self.update()
+    print(json.dumps({"import_main_ms": (imported - start) * 1000, "first_frame_ms": (time.perf_counter() - start) * 1000}), flush=True)
+    self.destroy()
+main.Gui.mainloop = mainloop
+main.App()
+"""
+
+#Return import times of modules {module: cumulative microseconds}, main and the modules it imports
+def measure_imports():
+    result = subprocess.run([sys.executable, "-X", "importtime", "-c", "import main"], cwd=ROOT, capture_output=True, text=True)
+    times = {}
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        _, cumulative, name = line[len("import time:"):].split("|")
+        #Every level of nested imports adds two spaces before the name, main and its own imports are shown
+        level = (len(name) - len(name.lstrip()) - 1) // 2
+        if level <= 1:
+            times[name.strip()] = int(cumulative)
+    return times
+
+#Return times of one cold start, the time of the whole process is measured by this process
+def measure_first_frame():
+    start = time.perf_counter()
+    process = subprocess.Popen([sys.executable, "-c", FIRST_FRAME_CODE], cwd=ROOT, stdout=subprocess.PIPE, text=True)
+    for line in process.stdout:
+        if line.startswith("{"):
+            result = json.loads(line)
+            result["process_first_frame_ms"] = (time.perf_counter() - start) * 1000
+            process.wait()
+            return result
+    process.wait()
+    raise RuntimeError("The window was not opened, is there a display?")
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--runs", type=int, default=5, help="number of cold starts")
+    parser.add_argument("--top", type=int, default=15, help="number of the slowest modules to show")
+    parser.add_argument("--json", action="store_true", help="print results as json")
+    args = parser.parse_args()
+
+    imports = measure_imports()
+    runs = [measure_first_frame() for _ in range(args.runs)]
+    summary = {key: sorted(run[key] for run in runs)[len(runs) // 2] for key in runs[0]}
+
+    if args.json:
+        print(json.dumps({"imports_us": imports, "runs": runs, "median": summary}, indent=2))
+        return
+    print("Slowest imports (cumulative):")
+    for name, microseconds in sorted(imports.items(), key=lambda item: -item[1])[:args.top]:
+        print(f"  {microseconds / 1000:8.1f} ms  {name}")
+    print(f"Median of {args.runs} runs:")
+    for key, value in summary.items():
+        print(f"  {key}: {value:.1f} ms")
+
+if __name__ == "__main__":
+    main()